@@ -1,9 +1,24 @@
 IP = "169.254.196.174"
 PORT = "9559"
 
+# In-process fake NAOqi session (src/utils/fake_naoqi.py) for running without a robot
+FAKE_ROBOT = False
+FAKE_RPC_LATENCY = 0.005  # Seconds added to every fake RPC
+FAKE_RPC_JITTER = 0.002
+
 # Camera settings
 CAMERA_RESOLUTION = 2  # 2 = 640x480
 CAMERA_COLOR_SPACE = 11  # 11 = RGB
 CAMERA_FPS = 30  # Target FPS for camera capture
 CAMERA_DISPLAY_WIDTH = 320
 CAMERA_DISPLAY_HEIGHT = 240
+
+# Motion dispatch (src/utils/motion_dispatcher.py)
+MOTION_DISPATCH_INTERVAL = 0.02  # Seconds between motion RPCs per channel (body, head)
+MOTION_REFRESH_INTERVAL = 1.0    # Re-send an unchanged walk velocity this often
+JOINT_SAMPLE_INTERVAL = 0.02     # Head joint cache sampling period (src/utils/joint_state.py)
+JOINT_STATE_MAX_AGE = 0.1        # Older cached angles are re-read before a relative head move
+
+# Replay a session recorded by src (utils/recording.py) instead of the live camera
+REPLAY_SESSION = None
+REPLAY_SPEED = 1.0
@@ -1,5 +1,4 @@
 # -*- coding: future_fstrings -*-
-import qi
 import config
 from robot_agent import NaoActions
 from robot_environment import NaoEnvironment
@@ -1,12 +1,17 @@
 # -*- coding: future_fstrings -*-
 # robot_environment.py 
 # File responsible for taking in various inputs and sending them to the NAO bot
-import qi
 import time
 import PIL.Image
 from io import BytesIO
 import numpy as np
 import config
+from shared import load_src_module
+
+try:
+    import qi
+except ImportError:
+    qi = None  # Only the fake session is available without the NAOqi SDK
 
 
 
@@ -19,11 +24,13 @@ class NaoEnvironment:
         self.port = str(port)
         self.session = None
         self.services = {}
+        self.motion_dispatcher = None
+        self.joint_state = None
         
     def init_robot(self):
         for attempt in range(3):
             try:
-                self.session = qi.Session()
+                self.session = self._create_session()
                 url = f"tcp://{self.ip}:{self.port}"
                 print(f"Attempting to connect to: {url}")
 
@@ -44,12 +51,40 @@ class NaoEnvironment:
                     self.session = None
                     return False
     
+    def _create_session(self):
+        if config.FAKE_ROBOT:
+            fake_naoqi = load_src_module('nao_fake_naoqi', 'utils/fake_naoqi.py')
+            return fake_naoqi.FakeSession(config.FAKE_RPC_LATENCY, config.FAKE_RPC_JITTER)
+        if qi is None:
+            raise RuntimeError("NAOqi SDK (qi) is not installed; set FAKE_ROBOT to run without a robot")
+        return qi.Session()
+    
     def _init_services(self):
         ### Initialize commonly used services after connection
         self.services["tts"] = self.session.service("ALTextToSpeech")
         self.services["motion"] = self.session.service("ALMotion")
         self.services["posture"] = self.session.service("ALRobotPosture")
-        self.services["video"] = self.session.service("ALVideoDevice")
+        
+        # Head angles come from ALMemory in the background instead of a getAngles per move
+        joint_state = load_src_module('nao_joint_state', 'utils/joint_state.py')
+        self.joint_state = joint_state.JointStateCache(
+            self.services["motion"], self.session.service("ALMemory"), interval=config.JOINT_SAMPLE_INTERVAL
+        )
+        self.joint_state.start()
+        
+        # Walk/head commands from the GUI loop are coalesced and sent asynchronously
+        motion_dispatcher = load_src_module('nao_motion_dispatcher', 'utils/motion_dispatcher.py')
+        self.motion_dispatcher = motion_dispatcher.MotionDispatcher(
+            self.services["motion"], config.MOTION_DISPATCH_INTERVAL, config.MOTION_REFRESH_INTERVAL,
+            joint_source=lambda: self.joint_state.read(config.JOINT_STATE_MAX_AGE)
+        )
+        self.motion_dispatcher.start()
+        if config.REPLAY_SESSION:
+            recording = load_src_module('nao_recording', 'utils/recording.py')
+            self.services["video"] = recording.SessionPlayer(config.REPLAY_SESSION, speed=config.REPLAY_SPEED)
+            print(f"Replaying camera from {config.REPLAY_SESSION}")
+        else:
+            self.services["video"] = self.session.service("ALVideoDevice")
     
     def get_service(self, service_name):
         ### Get a service, creating it if not already cached
@@ -73,31 +108,16 @@ class NaoEnvironment:
         if self.session is None:
             raise ConnectionError("Not connected to robot")
 
-        motion = self.services.get("motion")
-        if x != 0.0 or y != 0.0 or theta != 0.0:
-            motion.moveToward(x, y, theta)
-        else:
-            motion.stopMove()
+        # Only changes (and a slow keep-alive while walking) reach the robot
+        self.motion_dispatcher.set_velocity(x, y, theta)
     
     def head_endpoint(self, head_yaw_speed, head_pitch_speed, center=False):
-        motion = self.services.get("motion")
         if center:
             # Center the head with a smoother motion
-            motion.setAngles(["HeadYaw", "HeadPitch"], [0.0, 0.0], 0.2)
+            self.motion_dispatcher.set_head_angles(0.0, 0.0, 0.2)
         elif head_yaw_speed != 0.0 or head_pitch_speed != 0.0:
-            current_yaw, current_pitch = motion.getAngles(["HeadYaw", "HeadPitch"], True)
-            
-            # Calculate new positions with direct speed application
-            # Back to the original behavior that was working
-            new_yaw = current_yaw + head_yaw_speed
-            new_pitch = current_pitch + head_pitch_speed
-            
-            # Enforce angle limits
-            new_yaw = max(min(new_yaw, 2.0857), -2.0857)  # Yaw limits from NAO docs
-            new_pitch = max(min(new_pitch, 0.5149), -0.6720)  # Pitch limits from NAO docs
-            
-            # Set angles with faster movement speed for responsiveness
-            motion.setAngles(["HeadYaw", "HeadPitch"], [new_yaw, new_pitch], 0.2)
+            # Relative to the current pose, clamped to NAO's joint limits by the dispatcher
+            self.motion_dispatcher.change_head(head_yaw_speed, head_pitch_speed, 0.2)
 
     def posture_endpoint(self, name, speed):
         ### http://doc.aldebaran.com/2-1/naoqi/motion/alrobotposture-api.html#ALRobotPostureProxy::getPostureList
@@ -0,0 +1,12 @@
+# -*- coding: future_fstrings -*-
+# shared.py
+# Loads self-contained modules from ../src without importing src's packages,
+# whose config module would clash with better_gui's own config.py
+import os
+import imp
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+def load_src_module(name, relative_path):
+    """Load ``src/<relative_path>`` as a standalone module called ``name``."""
+    return imp.load_source(name, os.path.join(SRC_DIR, relative_path))
@@ -4,28 +4,109 @@
 # Robot Connection
 ROBOT_IP = "169.254.196.174"
 ROBOT_PORT = 9559
+FAKE_ROBOT = False         # Use the in-process fake NAOqi session (utils/fake_naoqi.py)
+FAKE_RPC_LATENCY = 0.005   # Seconds added to every fake RPC
+FAKE_RPC_JITTER = 0.002
+FAKE_TARGET_MOTION = 0.3   # Radians the synthetic camera's face sweeps; 0 keeps it still
+FAKE_FACE_IMAGE = None     # Optional face photo for the synthetic camera, so real detectors fire
 
 # Video Settings
-VIDEO_RESOLUTION = 2  # 320x240
+VIDEO_RESOLUTION = 2  # kVGA 640x480; reference coordinates for head tracking and CENTER_BOX
+TRACKING_RESOLUTION = 1  # kQVGA 320x240, streamed when frames only feed tracking/peekaboo
+SNAPSHOT_RESOLUTION = 2  # kVGA, on-demand subscription for saved images; also streamed in YOLO modes
+MODE_RESOLUTION = {'face': TRACKING_RESOLUTION, 'tflite': TRACKING_RESOLUTION,
+                   'yolo': SNAPSHOT_RESOLUTION, 'both': SNAPSHOT_RESOLUTION}
+RESOLUTION_SIZES = {0: (160, 120), 1: (320, 240), 2: (640, 480), 3: (1280, 960)}
+SNAPSHOT_IDLE_TIMEOUT = 5.0  # Seconds the high-res subscription stays open after a snapshot
 VIDEO_COLOR_SPACE = 11  # RGB
 VIDEO_FPS = 30
+FRAME_BUFFER_SIZE = 16  # Frames kept in the shared capture ring (~0.5 s at 30 fps)
 
 # Model Paths
 YOLO_MODEL = "../models/yolov8n.pt"
 TFLITE_MODEL = "../models/peekaboo_model.tflite"
 COCO_NAMES = "../models/coco.names"
 
+# Motion dispatch
+MOTION_DISPATCH_INTERVAL = 0.02  # Seconds between motion RPCs per channel (body, head)
+MOTION_REFRESH_INTERVAL = 1.0    # Re-send an unchanged walk velocity this often
+JOINT_SAMPLE_INTERVAL = 0.02     # Background head joint sampling period (utils/joint_state.py)
+JOINT_STATE_MAX_AGE = 0.1        # Older cached angles are re-read before a relative head move
+JOINT_HISTORY_SIZE = 256         # Timestamped head readings kept (~5 s at the sample interval)
+LATENCY_COMPENSATION = True      # Head targets relative to the pose when the frame was captured
+
+# Head tracking controller: 'lstm' (model in inference, lookup in training) or 'servo'
+HEAD_CONTROLLER = 'lstm'
+CAMERA_HFOV = 60.97              # NAO top camera field of view, degrees
+CAMERA_VFOV = 47.64
+SERVO_GAINS = (0.5, 0.0, 0.05)   # Kp, Ki, Kd on the angular error (models/visual_servo.py)
+SERVO_DEADBAND = 0.03            # Radians; no head command while the face is this close to centre
+SERVO_MAX_STEP = 0.15            # Largest head step per update, radians
+SERVO_MAX_RATE = 2.0             # Largest head step per second of elapsed time, rad/s
+SERVO_SPEED = 0.2                # setAngles speed fraction for servo moves
+FACE_FILTER = True               # Servo acts on a Kalman-predicted face position (models/face_filter.py)
+FILTER_PROCESS_NOISE = 2.0       # Face angular acceleration noise, rad^2/s^3
+FILTER_MEASUREMENT_NOISE = 0.02  # Detection noise, radians
+FILTER_GATE = 0.3                # Max radians between a track's prediction and a detection matched to it
+FILTER_COAST_TIME = 0.5          # Seconds a track is predicted through missed detections
+TRACK_CONTROL_INTERVAL = 0.02    # Servo control period on the filtered face, seconds
+
 # Training Settings
 SEQUENCE_LENGTH = 10
+LSTM_STREAMING = True            # Carry the LSTM hidden state across frames, one step per frame
+STREAM_CHECK_EVERY = 0           # Compare against the batch window every N steps (0 disables)
+STREAM_CHECK_TOLERANCE = 0.01    # Max movement difference before the state is rebuilt from the window
+INFERENCE_RUNTIME = 'auto'       # 'auto'/'torchscript' (use an export if present) or 'eager' (see models/export.py)
+TRAINER_BUFFER_SIZE = 2000       # Replay buffer of training windows (models/trainer.py)
+TRAINER_BATCH_SIZE = 32
+TRAINER_INTERVAL = 0.05          # Minimum seconds between background training steps
+TRAINER_PUBLISH_EVERY = 10       # Steps between weight swaps into the inference model
 MODEL_SAVE_DIR = "../src/movement_models"
 
 # GUI Settings
 CENTER_BOX = 150
 GUI_WIDTH = 600
 GUI_HEIGHT = 600
+DISPLAY_REFRESH_MS = 15  # How often the Tk thread picks up the newest rendered frame
 
 # Server Settings
 PREDICTION_SERVER_URL = "http://127.0.0.1:5000/predict"
+PEEKABOO_SERVER_URL = "http://127.0.0.1:5000/peekaboo"
+INFERENCE_TIMEOUT = 0.5          # Per-request deadline in seconds
+INFERENCE_CONNECT_TIMEOUT = 0.2
+INFERENCE_MAX_IN_FLIGHT = 2      # Pipelined requests allowed at once
+BREAKER_FAILURE_THRESHOLD = 3    # Consecutive failures before backing off
+BREAKER_BACKOFF_INITIAL = 0.5    # Seconds, doubled on each failed probe
+BREAKER_BACKOFF_MAX = 10.0
+
+# Adaptive encode/rate control (AIMD on measured round-trip time)
+LATENCY_BUDGET_MS = 150
+JPEG_QUALITY_MIN = 30
+JPEG_QUALITY_MAX = 90
+JPEG_QUALITY_STEP = 5
+CLIENT_SCALES = (1.0, 0.75, 0.5)  # Client-side downscale steps before encoding
+SEND_INTERVAL_MIN = 0.033        # Seconds between frames sent for inference
+SEND_INTERVAL_MAX = 0.5
+SEND_INTERVAL_STEP = 0.02
+
+# Local fallback face detector, used while the inference server is unreachable
+LOCAL_FALLBACK_ENABLED = True
+HAAR_CASCADE_PATH = None         # None uses OpenCV's bundled haarcascade_frontalface_default.xml
+LOCAL_DETECTOR_SCALE = 0.5       # Downscale before detection to keep it cheap on the client
+LOCAL_DETECTOR_MIN_NEIGHBORS = 4
+LOCAL_DETECTOR_MIN_SIZE = 20     # Smallest face in pixels of the downscaled frame
+
+# End-to-end latency accounting
+LATENCY_WINDOW = 300             # Samples per stage kept for rolling percentiles
+LATENCY_MAX_PENDING = 64         # Frame records kept before the oldest is retired
+NAO_CLOCK_OFFSET = None          # Seconds added to NAO timestamps; None estimates it from arrivals
+LATENCY_DUMP_DIR = "../latency"
+
+# Session record/replay (see utils/recording.py)
+RECORD_SESSION = False           # Record camera, inference results, joints and motion commands
+RECORDING_DIR = "../recordings"
+REPLAY_SESSION = None            # Path to a recording to use instead of the robot's camera
+REPLAY_SPEED = 1.0               # Playback speed multiplier; None replays frames back to back
 ZMQ_SERVER_IP = "172.18.0.1"
 ZMQ_PUSH_PORT = 5555
 ZMQ_SUB_PORT = 5556
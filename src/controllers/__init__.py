@@ -1,3 +1,4 @@
 # controllers/__init__.py
 from controllers.robot_controller import NaoRobot, ConnectionError
-from controllers.communication import NAOChatSystem
\ No newline at end of file
+from controllers.communication import NAOChatSystem
+from controllers.capture_manager import CaptureManager
\ No newline at end of file
@@ -0,0 +1,130 @@
+# -*- coding: future_fstrings -*-
+# controllers/capture_manager.py
+import copy
+import threading
+import numpy as np
+from utils import FrameCapture, rescale_prediction
+from config import RESOLUTION_SIZES, VIDEO_RESOLUTION, SNAPSHOT_RESOLUTION, SNAPSHOT_IDLE_TIMEOUT
+
+class CaptureManager:
+    """Camera subscriptions for one robot client, chosen per task.
+
+    The streaming subscription runs at a low resolution and feeds the shared
+    FrameRingBuffer for display, tracking and inference. Full-quality stills
+    come from a second, high-resolution subscription that is opened on the
+    first snapshot() and closed again after SNAPSHOT_IDLE_TIMEOUT seconds
+    without use.
+
+    Head tracking models and CENTER_BOX were tuned in VIDEO_RESOLUTION
+    pixels (the reference resolution); to_reference() maps predictions made
+    on any stream into that coordinate space.
+    """
+    
+    def __init__(self, video_service, name, frames, stream_resolution, color_space, fps,
+                 snapshot_resolution=SNAPSHOT_RESOLUTION, reference_resolution=VIDEO_RESOLUTION):
+        self.video_service = video_service
+        self.name = name
+        self.frames = frames
+        self.stream_resolution = stream_resolution
+        self.snapshot_resolution = snapshot_resolution
+        self.reference_resolution = reference_resolution
+        self.color_space = color_space
+        self.fps = fps
+        
+        self.stream_client = None
+        self.snapshot_client = None
+        self.frame_capture = None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_timer = None
+    
+    @property
+    def stream_size(self):
+        return RESOLUTION_SIZES[self.stream_resolution]
+    
+    @property
+    def snapshot_size(self):
+        return RESOLUTION_SIZES[self.snapshot_resolution]
+    
+    @property
+    def reference_size(self):
+        return RESOLUTION_SIZES[self.reference_resolution]
+    
+    def start(self):
+        """Subscribe the streaming camera and start the capture thread."""
+        self.stream_client = self.video_service.subscribe(
+            self.name, self.stream_resolution, self.color_space, self.fps
+        )
+        self.frame_capture = FrameCapture(self.video_service, self.stream_client, self.frames, self.fps)
+        self.frame_capture.start()
+        width, height = self.stream_size
+        print(f"Streaming {width}x{height} with client: {self.stream_client}")
+        return self.stream_client
+    
+    def snapshot(self):
+        """Grab one frame from the high-resolution subscription.
+        
+        Returns an RGB array in snapshot resolution, or None on failure.
+        """
+        with self._snapshot_lock:
+            try:
+                if self.snapshot_client is None:
+                    self.snapshot_client = self.video_service.subscribe(
+                        f"{self.name}_snapshot", self.snapshot_resolution, self.color_space, 1
+                    )
+                image = self.video_service.getImageRemote(self.snapshot_client)
+            except Exception as e:
+                print(f"Error taking snapshot: {e}")
+                return None
+            finally:
+                self._schedule_snapshot_release()
+        
+        if image is None or len(image) < 7:
+            print("Invalid snapshot data received")
+            return None
+        return np.frombuffer(image[6], dtype=np.uint8).reshape((image[1], image[0], 3))
+    
+    def _schedule_snapshot_release(self):
+        # Keep the high-res subscription warm for bursts of snapshots
+        if self._snapshot_timer is not None:
+            self._snapshot_timer.cancel()
+        self._snapshot_timer = threading.Timer(SNAPSHOT_IDLE_TIMEOUT, self.release_snapshot)
+        self._snapshot_timer.daemon = True
+        self._snapshot_timer.start()
+    
+    def release_snapshot(self):
+        """Close the high-resolution subscription if it is open."""
+        with self._snapshot_lock:
+            if self.snapshot_client is None:
+                return
+            try:
+                self.video_service.unsubscribe(self.snapshot_client)
+            except Exception as e:
+                print(f"Error releasing snapshot subscription: {e}")
+            self.snapshot_client = None
+    
+    def to_reference(self, prediction, frame_size):
+        """Copy of ``prediction`` with boxes mapped from ``frame_size`` (w, h) to the reference resolution."""
+        return self.map_prediction(prediction, frame_size, self.reference_size)
+    
+    @staticmethod
+    def map_prediction(prediction, from_size, to_size):
+        """Copy of ``prediction`` with face/YOLO boxes scaled between two resolutions.
+        
+        NAO resolutions all share the 4:3 aspect ratio, so one factor covers both axes.
+        """
+        if from_size == to_size:
+            return prediction
+        return rescale_prediction(copy.deepcopy(prediction), to_size[0] / float(from_size[0]))
+    
+    def stop(self):
+        """Stop capturing and release both subscriptions."""
+        if self.frame_capture:
+            self.frame_capture.stop()
+            self.frame_capture = None
+        if self._snapshot_timer is not None:
+            self._snapshot_timer.cancel()
+            self._snapshot_timer = None
+        self.release_snapshot()
+        if self.stream_client:
+            self.video_service.unsubscribe(self.stream_client)
+            self.stream_client = None
@@ -1,11 +1,22 @@
 # -*- coding: future_fstrings -*-
 # controllers/robot_controller.py
-import qi
 import time
 import os
+import cv2
 import random
-from utils import save_image, capture_frame, send_image_to_server
-from config import COVERED_DIR, UNCOVERED_DIR
+from utils import save_image, get_inference_client, FrameRingBuffer, LatencyTracker
+from utils import SessionRecorder, SessionPlayer, MotionDispatcher, JointStateCache
+from controllers.capture_manager import CaptureManager
+from utils import FakeSession
+from config import COVERED_DIR, UNCOVERED_DIR, RECORD_SESSION, RECORDING_DIR, REPLAY_SESSION, REPLAY_SPEED
+from config import FAKE_ROBOT, FAKE_RPC_LATENCY, FAKE_RPC_JITTER, FAKE_TARGET_MOTION, FAKE_FACE_IMAGE
+from config import MOTION_DISPATCH_INTERVAL, MOTION_REFRESH_INTERVAL, JOINT_SAMPLE_INTERVAL, JOINT_STATE_MAX_AGE
+from config import JOINT_HISTORY_SIZE
+
+try:
+    import qi
+except ImportError:
+    qi = None  # Only the fake session is available without the NAOqi SDK
 
 class ConnectionError(Exception):
     """Exception raised when the robot connection fails."""
@@ -24,6 +35,10 @@ class NaoRobot:
         # Connect to the robot
         self.session = self.connect_to_robot(ip, port)
         self.video_client = None
+        self.capture = None
+        self.recorder = None
+        self._last_move = None
+        self.frames = FrameRingBuffer()
         self.retry_attempts = 10
         
         if not self.session:
@@ -37,24 +52,56 @@ class NaoRobot:
         # Initialize other services
         self._setup_services()
         
+        # Head angles sampled in the background; relative moves read them locally
+        self.joint_state = JointStateCache(self.motion_service, self.memory_service,
+                                           interval=JOINT_SAMPLE_INTERVAL, max_age=JOINT_STATE_MAX_AGE,
+                                           history_size=JOINT_HISTORY_SIZE)
+        self.joint_state.start()
+        
+        # All walk/head commands go through one coalescing, rate-limited sender
+        self.motion_dispatcher = MotionDispatcher(
+            self.motion_service, MOTION_DISPATCH_INTERVAL, MOTION_REFRESH_INTERVAL,
+            joint_source=lambda: self.joint_state.read(JOINT_STATE_MAX_AGE)
+        )
+        self.motion_dispatcher.start()
+        
+        # Inference client shared with the GUI (pooled connections, deadlines, circuit breaker)
+        self.inference_client = get_inference_client()
+        
+        # Per-frame capture-to-display/actuation latency, fed by the video pipeline
+        self.latency = LatencyTracker()
+        
         # Keyboard tracking
         self.pressed_keys = set()
         self.text_entry = None
         
+        if RECORD_SESSION:
+            self.start_recording()
+        
     def _setup_video(self):
         """Set up the video service and client."""
-        from config import VIDEO_RESOLUTION, VIDEO_COLOR_SPACE, VIDEO_FPS
+        from config import MODE_RESOLUTION, VIDEO_RESOLUTION, VIDEO_COLOR_SPACE, VIDEO_FPS
         
-        self.resolution = VIDEO_RESOLUTION
+        # Stream only as many pixels as the mode needs; stills use a separate high-res subscription
+        self.resolution = MODE_RESOLUTION.get(self.mode, VIDEO_RESOLUTION)
         self.color_space = VIDEO_COLOR_SPACE
         self.fps = VIDEO_FPS
         
         try:
-            self.video_service = self.session.service("ALVideoDevice")
+            if REPLAY_SESSION:
+                # Recorded camera stream behind the ALVideoDevice interface
+                self.video_service = SessionPlayer(REPLAY_SESSION, speed=REPLAY_SPEED)
+                print(f"Replaying camera from {REPLAY_SESSION}")
+            else:
+                self.video_service = self.session.service("ALVideoDevice")
             self.video_service.setActiveCamera(0)
-            self.video_client = self.video_service.subscribe(
-                self.name, self.resolution, self.color_space, self.fps
+            
+            # Single capture thread; display and inference read self.frames
+            self.capture = CaptureManager(
+                self.video_service, self.name, self.frames,
+                self.resolution, self.color_space, self.fps
             )
+            self.video_client = self.capture.start()
             print(f"Video service initialized with client: {self.video_client}")
         except Exception as e:
             print(f"Error setting up video: {e}")
@@ -65,17 +112,49 @@ class NaoRobot:
             self.motion_service = self.session.service("ALMotion")
             self.posture_service = self.session.service("ALRobotPosture")
             self.battery_service = self.session.service("ALBattery")
+            self.memory_service = self.session.service("ALMemory")
             self.tts = self.session.service("ALTextToSpeech")
             self.tts.setParameter("defaultVoiceSpeed", 100)
         except Exception as e:
             print(f"Error setting up services: {e}")
     
+    def start_recording(self, path=None):
+        """Record the camera stream, joints, inference results and motion commands."""
+        if self.recorder:
+            return self.recorder.path
+        if path is None:
+            path = os.path.join(RECORDING_DIR, f"session_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.recorder = SessionRecorder(path, self.frames, self.joint_state)
+        self.recorder.start()
+        return path
+    
+    def stop_recording(self):
+        """Stop recording and close the session files."""
+        if self.recorder:
+            self.recorder.stop()
+            self.recorder = None
+    
+    def record_event(self, kind, data):
+        """Add an event to the current recording, if one is running."""
+        if self.recorder:
+            self.recorder.record_event(kind, data)
+    
     def assign_value(self, text_entry):
         """Assign text entry widget for keyboard focus checks."""
         self.text_entry = text_entry
     
     def connect_to_robot(self, ip, port, max_attempts=3):
         """Connect to the NAO robot with retry logic."""
+        if FAKE_ROBOT:
+            face_image = None
+            if FAKE_FACE_IMAGE:
+                face_image = cv2.cvtColor(cv2.imread(FAKE_FACE_IMAGE), cv2.COLOR_BGR2RGB)
+            session = FakeSession(FAKE_RPC_LATENCY, FAKE_RPC_JITTER,
+                                  target_motion=FAKE_TARGET_MOTION, face_image=face_image)
+            session.connect(f"tcp://{ip}:{port}")
+            return session
+        if qi is None:
+            raise ConnectionError("NAOqi SDK (qi) is not installed; set FAKE_ROBOT to run without a robot.")
         for attempt in range(max_attempts):
             try:
                 session = qi.Session()
@@ -136,25 +215,38 @@ class NaoRobot:
         if self.text_entry and self.text_entry.focus_get() != self.text_entry:
             self.pressed_keys.discard(event.keysym.lower())
     
+    def latest_frame(self, timeout=1.0):
+        """Return the newest camera frame from the shared ring buffer, or None."""
+        frame = self.frames.latest(timeout=timeout)
+        return frame.image if frame else None
+    
+    def snapshot_frame(self):
+        """Return a high-resolution still, falling back to the streamed frame."""
+        image = self.capture.snapshot() if self.capture else None
+        if image is None:
+            image = self.latest_frame()
+        return image
+    
     def _process_prediction_key(self):
         """Process 'p' key for prediction."""
-        image = capture_frame(self.video_service, self.video_client)
+        image = self.latest_frame()
         if image is not None:
-            prediction = send_image_to_server(image, self.mode)
-            if prediction and prediction[0] < 0.5:
+            prediction = self.inference_client.predict(image, self.mode)
+            tflite_prediction = prediction.get('tflite_prediction') if prediction else None
+            if tflite_prediction and tflite_prediction[0][0] < 0.5:
                 self.tts.say("Peekaboo!")
             print(prediction)
     
     def _save_as_covered(self):
         """Save current frame as a covered image."""
-        image = capture_frame(self.video_service, self.video_client)
+        image = self.snapshot_frame()
         if image is not None:
             save_image(image, COVERED_DIR, 'covered')
             self.tts.say("Covered image saved.")
     
     def _save_as_uncovered(self):
         """Save current frame as an uncovered image."""
-        image = capture_frame(self.video_service, self.video_client)
+        image = self.snapshot_frame()
         if image is not None:
             save_image(image, UNCOVERED_DIR, 'uncovered')
             self.tts.say("Uncovered image saved.")
@@ -191,44 +283,43 @@ class NaoRobot:
         if 'right' in self.pressed_keys:
             head_yaw -= 0.05  # Turn head right
         
-        # Apply body movement
-        if x != 0.0 or y != 0.0 or theta != 0.0:
-            self.motion_service.moveToward(x, y, theta)
-        else:
-            self.motion_service.stopMove()
+        # Only record commands that differ from the previous one
+        if self.recorder and (x, y, theta) != self._last_move:
+            self.record_event('move', {'x': x, 'y': y, 'theta': theta})
+        self._last_move = (x, y, theta)
+        
+        # The dispatcher only sends a walk command when the velocity changes
+        self.motion_dispatcher.set_velocity(x, y, theta)
         
         # Apply head movement
         if head_yaw != 0.0 or head_pitch != 0.0:
             self._apply_head_movement(head_yaw, head_pitch)
     
     def _apply_head_movement(self, yaw_change, pitch_change):
-        """Apply changes to head position with safety limits."""
-        try:
-            current_yaw, current_pitch = self.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
-            new_yaw = current_yaw + yaw_change
-            new_pitch = current_pitch + pitch_change
-            
-            # Apply safety limits
-            new_yaw = max(min(new_yaw, 2.0857), -2.0857)
-            new_pitch = max(min(new_pitch, 0.5149), -0.6720)
-            
-            self.motion_service.setAngles(
-                ["HeadYaw", "HeadPitch"],
-                [new_yaw, new_pitch],
-                0.1  # Movement speed
-            )
-        except Exception as e:
-            print(f"Error applying head movement: {e}")
+        """Apply changes to head position; the dispatcher enforces the joint limits."""
+        self.motion_dispatcher.change_head(yaw_change, pitch_change, 0.1)
+        self.record_event('head_change', {'HeadYaw': yaw_change, 'HeadPitch': pitch_change})
     
     def shutdown(self):
         """Shut down the robot and clean up resources."""
         try:
             print("Shutting down robot...")
+            self.motion_dispatcher.stop()
+            self.joint_state.stop()
+            motion = self.motion_dispatcher.snapshot()
+            print(f"Motion: {motion['requests_per_s']:.1f} commands/s -> {motion['rpcs_per_s']:.1f} RPCs/s")
             self.motion_service.stopMove()
             self.motion_service.rest()
-            if self.video_client:
-                self.video_service.unsubscribe(self.video_client)
+            self.stop_recording()
+            if self.capture:
+                self.capture.stop()
+                self.capture = None
                 self.video_client = None
+            self.frames.close()
+            self.inference_client.close()
+            if FAKE_ROBOT:
+                for method, rate in sorted(self.session.rpc_rates().items()):
+                    print(f"  {method}: {rate:.1f} calls/s")
             print("Robot shutdown complete")
         except Exception as e:
             print(f"Error during shutdown: {e}")
\ No newline at end of file
@@ -10,9 +10,11 @@ from datetime import datetime
 import requests
 import base64
 from robot import NaoRobot
-from utils import capture_frame, save_image, send_image_to_server
+from utils import capture_frame, save_image, get_inference_client, JointStateCache
 from config import CENTER_BOX
 from head_movement import head_relative_to_center, HeadTracker
+from models.trainer import BackgroundTrainer
+from models.checkpoint import CheckpointSaver, load_checkpoint
 from nao_zmq import NAOChatSystem
 
 
@@ -36,6 +38,7 @@ class NaoControlGUI:
         self.video_client = self.robot.video_client
         self.battery_service = self.robot.battery_service
         self.tts = self.robot.tts
+        self.inference_client = get_inference_client()
         self.tts.setParameter("defaultVoiceSpeed", 100)
         self.last_state_covered = False
 
@@ -83,10 +86,18 @@ class NaoControlGUI:
         speak_button.grid(row=2, column=3, padx=10, pady=10)
 
         self.initialize_chat_system()
-        self.head_tracker = HeadTracker(self.motion_service)
+        self.joint_state = JointStateCache(self.motion_service)
+        self.joint_state.start()
+        self.head_tracker = HeadTracker(self.motion_service, self.joint_state)
         self.training_mode = training_bool
         self.file_path = file_path
         self.training_samples = 0
+        self.trainer = None
+        self.saver = CheckpointSaver()  # Checkpoints are written off the Tk thread
+        if training_bool:
+            # Train off the Tk thread instead of one step per video callback
+            self.trainer = BackgroundTrainer(self.head_tracker)
+            self.trainer.start()
         
         # Add training label - Python 2.7 Tkinter
         self.training_label = tk.Label(root, text="Training Samples: 0")
@@ -145,7 +156,7 @@ class NaoControlGUI:
                 return
 
             display_image = image.copy()
-            prediction = send_image_to_server(image, self.mode)
+            prediction = self.inference_client.predict(image, self.mode)
             
             if prediction and self.mode == "face":
                 try:
@@ -161,7 +172,7 @@ class NaoControlGUI:
                             if movement is not None:
                                 self.head_tracker.apply_movement(movement)
                             self.head_tracker.add_training_sample(face_coords, position)
-                            loss = self.head_tracker.train_step()
+                            loss = self.trainer.snapshot()['loss']
                             
                             self.training_samples += 1
                             status = "Training Samples: %d" % self.training_samples
@@ -203,6 +214,9 @@ class NaoControlGUI:
                     print("Error updating display: {}".format(e))
                     
                 self.root.after(50, self.update_video_stream)
+            else:
+                # No prediction (server down or deadline missed); keep polling
+                self.root.after(100, self.update_video_stream)
                 
         except Exception as e:
             print("Error in video stream update: %s" % str(e))
@@ -211,20 +225,19 @@ class NaoControlGUI:
 
 
     def save_model(self):
+        current_time = datetime.now().strftime("%H%M%S")
+        save_path = "movement_models/samplesize_%d_%s" % (self.training_samples, current_time)
+        samples = self.training_samples
+        def saved(success, path):
+            if success:
+                msg = "Model saved with %d samples" % samples
+                self.tts.say(msg)
+                print(msg)
+            else:
+                self.tts.say("Error saving model")
         try:
-            current_time = datetime.now().strftime("%H%M%S")  # Format: YYYYMMDD_HHMMSS
-            save_path = "movement_models/samplesize_%d_%s.pth" % (self.training_samples, current_time)
-            save_data = {
-                'model_state_dict': self.head_tracker.model.state_dict(),
-                'optimizer_state_dict': self.head_tracker.optimizer.state_dict(),
-                'training_samples': self.training_samples,
-                'training_data': self.head_tracker.training_data,
-                'position_to_movement': self.head_tracker.position_to_movement
-            }
-            torch.save(save_data, save_path)
-            msg = "Model saved with %d samples" % self.training_samples
-            self.tts.say(msg)
-            print(msg)
+            # Snapshot here, write on the saver thread so the video loop keeps running
+            self.saver.save(self.head_tracker, save_path, callback=saved)
         except Exception as e:
             error_msg = "Error saving model: %s" % str(e)
             print(error_msg)
@@ -232,12 +245,12 @@ class NaoControlGUI:
 
     def load_model(self, model_path):
         try:
-            checkpoint = torch.load(model_path)
-            self.head_tracker.model.load_state_dict(checkpoint['model_state_dict'])
-            self.head_tracker.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-            self.training_samples = checkpoint['training_samples']
-            self.head_tracker.training_data = checkpoint['training_data']
-            self.head_tracker.position_to_movement = checkpoint['position_to_movement']
+            # Inference only: the weights, not the optimizer state or training data
+            checkpoint = load_checkpoint(model_path)
+            self.head_tracker.model.load_state_dict(checkpoint.model_state())
+            self.head_tracker.checkpoint = checkpoint
+            self.training_samples = checkpoint.training_samples
+            self.head_tracker.position_to_movement = checkpoint.position_to_movement
             self.training_mode = False  # Ensure inference mode is set
             #print("Model loaded successfully, ready for inference.")
         except Exception as e:
@@ -358,6 +371,9 @@ class NaoControlGUI:
     def cleanup(self):
         """Modify your cleanup method to include"""
         try:
+            if self.trainer:
+                self.trainer.stop()
+            self.saver.wait()
             if hasattr(self, 'video_client'):
                 self.video_service.unsubscribe(self.video_client)
             if hasattr(self, 'chat_system'):
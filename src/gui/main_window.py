@@ -5,7 +5,7 @@ from gui.video_panel import VideoPanel
 from gui.control_panel import ControlPanel
 from gui.status_panel import StatusPanel
 from controllers import NAOChatSystem
-from models import HeadTracker
+from models import HeadTracker, VisualServoController, FaceTrackSet, BackgroundTrainer
 import config
 
 class NaoControlGUI:
@@ -36,12 +36,20 @@ class NaoControlGUI:
         
         # Initialize head tracker if in face mode
         self.head_tracker = None
+        self.trainer = None
         if mode in ['face', 'both']:
-            self.head_tracker = HeadTracker(self.robot.motion_service)
+            servo = VisualServoController() if config.HEAD_CONTROLLER == 'servo' else None
+            face_filter = FaceTrackSet() if servo and config.FACE_FILTER else None
+            self.head_tracker = HeadTracker(self.robot.motion_service, self.robot.motion_dispatcher,
+                                            self.robot.joint_state, servo, face_filter)
             if not training_bool and file_path:
-                success, samples = self.head_tracker.load_model(file_path)
+                success, samples = self.head_tracker.load_model(file_path, inference=True)
                 if success:
                     print(f"Model loaded successfully with {samples} training samples")
+            if training_bool:
+                # Training runs off the GUI threads on mini-batches from a replay buffer
+                self.trainer = BackgroundTrainer(self.head_tracker)
+                self.trainer.start()
                 
         # Create main frames
         self.control_frame = tk.Frame(root)
@@ -56,7 +64,8 @@ class NaoControlGUI:
         # Initialize components
         self.control_panel = ControlPanel(self.control_frame, robot, self.chat_system)
         self.video_panel = VideoPanel(self.video_frame, robot, mode, self.head_tracker)
-        self.status_panel = StatusPanel(self.status_frame, robot, self.head_tracker, training_bool)
+        self.status_panel = StatusPanel(self.status_frame, robot, self.head_tracker, training_bool,
+                                        self.trainer)
         
         # Set up callbacks for chat messages
         self._setup_chat_callbacks()
@@ -90,17 +99,20 @@ class NaoControlGUI:
     
     def _setup_automatic_updates(self):
         """Set up automatic updates for various components."""
+        # Capture and inference run on the video panel's own threads
+        self.video_panel.start()
+        
         # Start with a slight delay to ensure everything is initialized
         self.root.after(100, self.update_video_stream)
         self.root.after(100, self.update_robot_movement)
         self.root.after(100, self.update_battery_status)
+        self.root.after(500, self.update_link_status)
     
     def update_video_stream(self):
-        """Update the video stream and schedule the next update."""
-        success = self.video_panel.update_frame()
-        # Schedule the next update (shorter delay for success, longer for failure)
-        delay = 50 if success else 100
-        self.root.after(delay, self.update_video_stream)
+        """Show the newest rendered frame and schedule the next update."""
+        self.video_panel.update_frame()
+        # Polling is cheap; capture and inference happen off the Tk thread
+        self.root.after(config.DISPLAY_REFRESH_MS, self.update_video_stream)
     
     def update_robot_movement(self):
         """Update robot movement and schedule the next update."""
@@ -118,8 +130,19 @@ class NaoControlGUI:
         # Battery updates are less frequent (every 10 seconds)
         self.root.after(10000, self.update_battery_status)
     
+    def update_link_status(self):
+        """Refresh the inference link and latency displays twice a second."""
+        self.status_panel.update_link_status()
+        self.status_panel.update_latency_status()
+        self.status_panel.update_training_status()
+        self.root.after(500, self.update_link_status)
+    
     def handle_escape(self, event):
         """Handle the escape key event."""
+        self.video_panel.stop()
+        if self.trainer:
+            self.trainer.stop()
+        self.status_panel.wait_for_saves()
         self.root.quit()
         self.robot.shutdown()
     
@@ -129,6 +152,12 @@ class NaoControlGUI:
             # Cancel all scheduled events
             for after_id in self.root.tk.call('after', 'info'):
                 self.root.after_cancel(after_id)
+            
+            # Stop the video pipeline before the robot unsubscribes the camera
+            self.video_panel.stop()
+            if self.trainer:
+                self.trainer.stop()
+            self.status_panel.wait_for_saves()
                 
             # Shutdown robot
             self.robot.shutdown()
@@ -3,13 +3,12 @@
 import Tkinter as tk
 import time
 from datetime import datetime
-import torch
 from config import MODEL_SAVE_DIR
 
 class StatusPanel:
     """Panel showing robot status like battery level and training status."""
     
-    def __init__(self, parent, robot, head_tracker=None, training_mode=False):
+    def __init__(self, parent, robot, head_tracker=None, training_mode=False, trainer=None):
         """Initialize the status panel.
         
         Args:
@@ -17,16 +16,25 @@ class StatusPanel:
             robot: NaoRobot instance
             head_tracker: HeadTracker instance for training
             training_mode: Boolean indicating if in training mode
+            trainer: BackgroundTrainer training the head tracker (optional)
         """
         self.parent = parent
         self.robot = robot
         self.head_tracker = head_tracker
         self.training_mode = training_mode
+        self.trainer = trainer
         self.training_samples = 0
+        self.saver = None  # CheckpointSaver, started on the first save
         
         # Battery status
         self._create_battery_display()
         
+        # Inference link operating point
+        self._create_link_display()
+        
+        # End-to-end frame latency
+        self._create_latency_display()
+        
         # Training status (if in training mode)
         if training_mode and head_tracker:
             self._create_training_display()
@@ -44,6 +52,33 @@ class StatusPanel:
         self.canvas.grid(row=1, column=0, columnspan=2, padx=10, pady=10)
         self.battery_bar = self.canvas.create_rectangle(10, 10, 10, 40, fill="green")
     
+    def _create_link_display(self):
+        """Create the inference link status display."""
+        self.link_label = tk.Label(
+            self.parent, 
+            text="Link: waiting for server", 
+            font=("Helvetica", 10)
+        )
+        self.link_label.grid(row=4, column=0, columnspan=2, padx=10, pady=5)
+    
+    def _create_latency_display(self):
+        """Create the frame latency breakdown display and dump button."""
+        self.latency_label = tk.Label(
+            self.parent, 
+            text="Latency: no frames yet", 
+            font=("Helvetica", 10),
+            justify=tk.LEFT
+        )
+        self.latency_label.grid(row=5, column=0, columnspan=2, padx=10, pady=5)
+        
+        dump_button = tk.Button(
+            self.parent, 
+            text="Dump Latency", 
+            command=self.dump_latency, 
+            font=("Helvetica", 10)
+        )
+        dump_button.grid(row=6, column=0, columnspan=2, padx=10, pady=5)
+    
     def _create_training_display(self):
         """Create training status display."""
         self.training_label = tk.Label(
@@ -73,34 +108,103 @@ class StatusPanel:
             print(f"Error updating battery status: {e}")
             return False
     
-    def update_training_status(self, loss=None):
-        """Update the training status display."""
+    def update_link_status(self):
+        """Show the rate controller's current operating point and fallback state."""
+        client = self.robot.inference_client
+        parts = []
+        point = client.rate_controller.snapshot() if client.rate_controller else None
+        if point and point['rtt_ms'] is not None:
+            parts.append(f"Link: RTT {point['rtt_ms']:.0f}/{point['budget_ms']:.0f} ms"
+                         f" | server {point['server_ms'] or 0.0:.0f} ms"
+                         f" | q{point['quality']} x{point['scale']:.2f}"
+                         f" | every {point['send_interval'] * 1000.0:.0f} ms")
+        if client.using_fallback:
+            local = client.fallback.snapshot()
+            parts.append(f"server unreachable, local detector {local['avg_ms'] or 0.0:.0f} ms")
+        elif client.breaker.is_open:
+            parts.append("server unreachable")
+        if parts:
+            self.link_label.config(text=" | ".join(parts))
+    
+    def update_latency_status(self):
+        """Show median/p90 per pipeline stage, from NAO capture to display and actuation."""
+        motion = self.robot.motion_dispatcher.snapshot()
+        motion_text = (f"Motion: {motion['requests_per_s']:.0f} commands/s"
+                       f" -> {motion['rpcs_per_s']:.0f} RPCs/s"
+                       f" | joints {self.robot.joint_state.age * 1000:.0f} ms old")
+        servo = self.head_tracker.servo.snapshot() if self.head_tracker and self.head_tracker.servo else None
+        if servo and servo['engagements']:
+            motion_text += (f"\nServo: centred {servo['engagements']} ({servo['lost']} lost) in"
+                            f" {servo['time_to_centre']:.2f} s / {servo['frames_to_centre']:.1f} frames,"
+                            f" overshoot {servo['overshoot'] * 100:.0f}% (max {servo['max_overshoot'] * 100:.0f}%)")
+        summary = self.robot.latency.percentiles()
+        if not summary:
+            self.latency_label.config(text=motion_text)
+            return
+        short_names = [('camera', 'cam'), ('queue', 'queue'), ('encode', 'enc'), ('network', 'net'),
+                       ('server', 'server'), ('local_detector', 'local'), ('annotate', 'annot'),
+                       ('display', 'disp'), ('actuate', 'act')]
+        stages = " | ".join(f"{short} {summary[name]['p50']:.0f}"
+                            for name, short in short_names if name in summary)
+        totals = " | ".join(f"{label} {summary[name]['p50']:.0f}/{summary[name]['p90']:.0f}"
+                            for name, label in [('glass_to_display', 'glass-to-display'),
+                                                ('glass_to_actuation', 'glass-to-actuation')]
+                            if name in summary)
+        self.latency_label.config(text=f"Latency p50 ms: {stages}\n{totals} (p50/p90 ms)\n{motion_text}")
+    
+    def dump_latency(self):
+        """Write the latency percentiles and per-frame breakdowns to a file."""
+        try:
+            path = self.robot.latency.dump()
+            print(f"Latency report written to {path}")
+        except Exception as e:
+            print(f"Error dumping latency report: {e}")
+    
+    def _model_saved(self, success, path, samples):
+        """Runs on the saver thread once a checkpoint is written."""
+        if success:
+            msg = f"Model saved with {samples} samples"
+            self.robot.tts.say(msg)
+            print(f"{msg} to {path}")
+        else:
+            self.robot.tts.say("Error saving model")
+    
+    def wait_for_saves(self):
+        """Let queued checkpoint writes finish before shutdown."""
+        if self.saver is not None:
+            self.saver.wait()
+    
+    def update_training_status(self):
+        """Show sample count and the background trainer's loss and throughput."""
         if not self.training_mode or not hasattr(self, 'training_label'):
             return
             
-        self.training_samples += 1
+        self.training_samples = len(self.head_tracker.training_data)
         status = f"Training Samples: {self.training_samples}"
-        if loss is not None:
-            status += f" | Loss: {loss:.4f}"
+        if self.trainer:
+            stats = self.trainer.snapshot()
+            if stats['loss'] is not None:
+                status += f" | Loss: {stats['loss']:.4f}"
+            status += (f"\nBuffer {stats['buffer']} | {stats['steps']} steps"
+                       f" ({stats['steps_per_s']:.1f}/s, {stats['windows_per_s']:.0f} windows/s)")
         self.training_label.config(text=status)
     
     def save_model(self):
-        """Save the current model."""
+        """Snapshot the current model and write it on the saver thread."""
         if not self.head_tracker:
             return
             
         try:
             current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_path = f"{MODEL_SAVE_DIR}/model_samplesize_{self.training_samples}_{current_time}.pth"
-            
-            success = self.head_tracker.save_model(save_path)
+            samples = len(self.head_tracker.training_data)
+            save_path = f"{MODEL_SAVE_DIR}/model_samplesize_{samples}_{current_time}"
             
-            if success:
-                msg = f"Model saved with {self.training_samples} samples"
-                self.robot.tts.say(msg)
-                print(msg)
-            else:
-                self.robot.tts.say("Error saving model")
+            if self.saver is None:
+                # Imported here so the panel itself does not pull in torch
+                from models.checkpoint import CheckpointSaver
+                self.saver = CheckpointSaver()
+            self.saver.save(self.head_tracker, save_path,
+                            callback=lambda success, path: self._model_saved(success, path, samples))
         except Exception as e:
             error_msg = f"Error saving model: {e}"
             print(error_msg)
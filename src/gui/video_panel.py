@@ -3,12 +3,22 @@
 import Tkinter as tk
 from PIL import Image, ImageTk
 import time
-from utils import capture_frame, send_image_to_server, annotate_image, load_class_names
-from config import COCO_NAMES, CENTER_BOX
+import threading
+from utils import annotate_image, calculate_frame, load_class_names
+from utils.pipeline import LatestValue
+from config import COCO_NAMES, CENTER_BOX, SERVO_SPEED, LATENCY_COMPENSATION, TRACK_CONTROL_INTERVAL
+from config import LSTM_STREAMING
 from models import head_relative_to_center
 
 class VideoPanel:
-    """Panel for displaying the video feed with annotations."""
+    """Panel for displaying the video feed with annotations.
+    
+    Frames come from the robot's shared ring buffer (filled by its single
+    capture thread). Inference and rendering run on their own threads and
+    hand results on through LatestValue slots, so a slow server only
+    delays the overlays, never the video or the Tk event loop. The Tk
+    thread just picks up the newest rendered frame in update_frame().
+    """
     
     def __init__(self, parent, robot, mode, head_tracker=None):
         """Initialize the video panel.
@@ -28,6 +38,19 @@ class VideoPanel:
         self.bottom_r = None
         self.last_state_covered = False
         
+        # Peekaboo session state (tflite mode)
+        self.peekaboo_state = 'unknown'
+        self.peekaboo_next_send = 0.0
+        
+        # Pipeline: robot.frames -> inference -> predictions
+        #           robot.frames + predictions -> render -> rendered -> Tk
+        self.predictions = LatestValue()
+        self.rendered = LatestValue()
+        self.running = False
+        self.threads = []
+        self._displayed_seq = 0
+        self._unactuated = None  # Newest filtered detection not yet followed by a head move
+        
         # Video feed label
         self.video_label = tk.Label(parent)
         self.video_label.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
@@ -42,47 +65,179 @@ class VideoPanel:
         """Set training mode on or off."""
         self.training_mode = training_mode
     
+    def start(self):
+        """Start the inference and render threads."""
+        if self.running:
+            return
+        self.running = True
+        targets = [self._inference_loop, self._render_loop]
+        if self.head_tracker and self.head_tracker.face_filter:
+            targets.append(self._control_loop)
+        for target in targets:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+    
+    def stop(self):
+        """Stop the pipeline threads."""
+        self.running = False
+        for slot in (self.predictions, self.rendered):
+            slot.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
+    
     def update_frame(self):
-        """Update the video frame with detection results."""
+        """Display the newest rendered frame. Runs on the Tk thread.
+        
+        Returns True if a new frame was shown.
+        """
+        seq, rendered = self.rendered.peek()
+        if rendered is None or seq == self._displayed_seq:
+            return False
+        self._displayed_seq = seq
+        img, frame_seq = rendered
+        
         try:
-            # Capture frame from robot
-            image = capture_frame(self.robot.video_service, self.robot.video_client)
-            if image is None:
-                return False
-            
-            # Send image for detection
-            prediction = send_image_to_server(image, self.mode)
-            
-            # Check if prediction is valid
-            if not prediction:
-                return False
-                
-            display_image = image.copy()
-            
-            # Annotate image based on detection results
-            display_image, self.top_l, self.bottom_r = annotate_image(
-                display_image, prediction, self.mode, self.class_names, 
-                self.center_frame_dimensions
-            )
-            
-            # Process face tracking if in face mode
-            if self.mode == 'face' and self.head_tracker and prediction.get('face_locations'):
-                self._process_face_tracking(prediction)
-            
-            # Convert and display image
+            imgtk = ImageTk.PhotoImage(image=img)
+            self.video_label.imgtk = imgtk
+            self.video_label.configure(image=imgtk)
+            if frame_seq is not None:
+                self.robot.latency.stamp(frame_seq, 'displayed')
+            return True
+        except Exception as e:
+            print(f"Error updating display: {e}")
+            return False
+    
+    def _inference_loop(self):
+        """Inference stage: keep the client's request window busy with the newest frames."""
+        client = self.robot.inference_client
+        last_seq = 0
+        last_submit = 0.0
+        while self.running:
             try:
-                img = Image.fromarray(display_image)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.video_label.imgtk = imgtk
-                self.video_label.configure(image=imgtk)
-                return True
+                # Peekaboo runs as a server-side session that only classifies the frames it needs
+                if self.mode == 'tflite':
+                    frame = self.robot.frames.latest(last_seq, timeout=0.1)
+                    if frame is not None:
+                        last_seq = frame.seq
+                        prediction = self._update_peekaboo(frame.image)
+                        if prediction:
+                            self.predictions.put(prediction)
+                    continue
+                
+                # Results come back in submission order
+                for _, frame, prediction in client.collect():
+                    if prediction:
+                        prediction['frame_seq'] = frame.seq
+                        prediction['capture_time'] = self.robot.latency.capture_time(frame)
+                        self.robot.latency.record_response(frame.seq, prediction)
+                        self.robot.record_event('inference', prediction)
+                        self._handle_prediction(frame.image, prediction)
+                
+                if client.in_flight >= client.max_in_flight:
+                    time.sleep(0.005)
+                    continue
+                
+                # Pace sends at the interval chosen by the client's rate controller
+                wait = client.send_interval - (time.time() - last_submit)
+                if wait > 0:
+                    time.sleep(min(wait, 0.05))
+                    continue
+                
+                frame = self.robot.frames.latest(last_seq, timeout=0.1)
+                if frame is None:
+                    continue
+                last_seq = frame.seq
+                frame_info = {'frame_seq': frame.seq, 'frame_timestamp': frame.timestamp}
+                if client.submit(frame.image, self.mode, context=frame, frame_info=frame_info) is None:
+                    # Window full or server backing off; retry on a newer frame
+                    time.sleep(0.01)
+                else:
+                    self.robot.latency.begin(frame)
+                    last_submit = time.time()
             except Exception as e:
-                print(f"Error updating display: {e}")
-                return False
+                print(f"Error in inference stage: {e}")
+                time.sleep(0.1)
+    
+    def _render_loop(self):
+        """Render stage: overlay the latest prediction on each new frame."""
+        last_seq = 0
+        while self.running:
+            frame = self.robot.frames.latest(last_seq, timeout=0.1)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            try:
+                _, prediction = self.predictions.peek()
+                # Ring buffer frames are shared and read-only; draw on a copy
+                display_image = frame.image.copy()
+                
+                # CENTER_BOX is in reference pixels; draw it at the same relative size on this stream
+                width = display_image.shape[1]
+                center_dim = self.center_frame_dimensions * width / float(self.robot.capture.reference_size[0])
                 
+                # Annotate image based on the most recent detection results
+                display_image, _, _ = annotate_image(
+                    display_image, prediction or {}, self.mode, self.class_names, center_dim
+                )
+                
+                # Only the first render/display of a prediction is stamped; repeats are ignored
+                frame_seq = prediction.get('frame_seq') if prediction else None
+                if frame_seq is not None:
+                    self.robot.latency.stamp(frame_seq, 'annotated')
+                
+                self.rendered.put((Image.fromarray(display_image), frame_seq))
+            except Exception as e:
+                print(f"Error rendering frame: {e}")
+    
+    def _handle_prediction(self, image, prediction):
+        """Publish a prediction and drive head tracking from it."""
+        self.predictions.put(prediction)
+        
+        # Process face tracking if in face mode
+        if self.mode == 'face' and self.head_tracker and prediction.get('face_locations'):
+            # Tracking works in reference-resolution pixels regardless of the stream size
+            height, width = image.shape[:2]
+            capture = self.robot.capture
+            ref_width, ref_height = capture.reference_size
+            self.top_l, self.bottom_r = calculate_frame(ref_width, ref_height, self.center_frame_dimensions)
+            self._process_face_tracking(capture.to_reference(prediction, (width, height)))
+        elif self.mode == 'face' and self.head_tracker and self.head_tracker.servo:
+            # With a face filter the control loop coasts through misses instead
+            if not self.head_tracker.face_filter:
+                self.head_tracker.servo.lose()
+        elif self.mode == 'face' and self.head_tracker and not self.training_mode:
+            # Track lost: the next face starts a fresh LSTM sequence
+            self.head_tracker.reset_stream()
+    
+    def _update_peekaboo(self, image):
+        """Feed the peekaboo session when due and react to its transitions."""
+        now = time.time()
+        if now >= self.peekaboo_next_send:
+            client = self.robot.inference_client
+            result = client.peekaboo(image, self.robot.name, self._face_present(client, image))
+            if not result:
+                return None
+            self.peekaboo_next_send = now + result.get('next_interval', 0.0)
+            self.peekaboo_state = result.get('state', self.peekaboo_state)
+            for event in result.get('events', []):
+                # Same trigger as the 'p' key: a low score means covered
+                if event['event'] == 'covered':
+                    self.robot.tts.say("Peekaboo!")
+            self.last_state_covered = self.peekaboo_state == 'covered'
+        return {'peekaboo_state': self.peekaboo_state}
+    
+    def _face_present(self, client, image):
+        """Whether the local detector sees a face, so the server can escalate; None without one."""
+        if client.fallback is None:
+            return None
+        try:
+            return bool(client.fallback.detect(image).get('face_locations'))
         except Exception as e:
-            print(f"Error in video frame update: {e}")
-            return False
+            print(f"Error in local face check: {e}")
+            return None
     
     def _process_face_tracking(self, prediction):
         """Process face tracking for detected faces."""
@@ -90,21 +245,77 @@ class VideoPanel:
             return
             
         position = head_relative_to_center(prediction, self.top_l, self.bottom_r)
+        base_pose = self._capture_pose(prediction)
         
         # If face is detected
         if prediction['face_locations']:
             face_coords = prediction['face_locations'][0]
             
-            if self.training_mode and self.head_tracker:
+            if self.head_tracker and self.head_tracker.face_filter:
+                # The control loop acts on the filtered prediction between detections
+                pose = base_pose or self.robot.joint_state.angles
+                capture_time = prediction.get('capture_time') or time.time()
+                if pose is not None:
+                    self.head_tracker.observe_faces(prediction['face_locations'],
+                                                    self.robot.capture.reference_size, capture_time, pose)
+                    self._unactuated = prediction
+                if self.training_mode:
+                    self.head_tracker.add_training_sample(face_coords, position)
+                
+            elif self.head_tracker and self.head_tracker.servo:
+                # Closed loop on the pixel offset; training still labels samples by region
+                movement = self.head_tracker.servo.update(face_coords, self.robot.capture.reference_size)
+                if movement is not None:
+                    self.head_tracker.apply_movement(movement, SERVO_SPEED, base_pose)
+                    self._stamp_actuated(prediction, movement)
+                if self.training_mode:
+                    self.head_tracker.add_training_sample(face_coords, position)
+                
+            elif self.training_mode and self.head_tracker:
                 # Training mode - add sample and get movement
                 movement = self.head_tracker.get_movement_from_position(position)
                 if movement is not None:
-                    self.head_tracker.apply_movement(movement)
+                    self.head_tracker.apply_movement(movement, base_pose=base_pose)
+                    self._stamp_actuated(prediction, movement)
                 self.head_tracker.add_training_sample(face_coords, position)
                 
             elif self.head_tracker:
                 # Inference mode - use model for prediction
-                self.head_tracker.position_history.append(face_coords)
-                if len(self.head_tracker.position_history) >= self.head_tracker.sequence_length:
-                    movement = self.head_tracker.predict_movement(list(self.head_tracker.position_history))
-                    self.head_tracker.apply_movement(movement)
\ No newline at end of file
+                if LSTM_STREAMING:
+                    movement = self.head_tracker.predict_movement_step(face_coords)
+                else:
+                    movement = None
+                    self.head_tracker.position_history.append(face_coords)
+                    if len(self.head_tracker.position_history) >= self.head_tracker.sequence_length:
+                        movement = self.head_tracker.predict_movement(list(self.head_tracker.position_history))
+                if movement is not None:
+                    self.head_tracker.apply_movement(movement, base_pose=base_pose)
+                    self._stamp_actuated(prediction, movement)
+    
+    def _control_loop(self):
+        """Servo on the face filter's prediction at TRACK_CONTROL_INTERVAL, between detections too."""
+        while self.running:
+            started = time.time()
+            try:
+                movement, pose = self.head_tracker.filtered_step(started)
+                if movement is not None:
+                    self.head_tracker.apply_movement(movement, SERVO_SPEED, pose)
+                    prediction, self._unactuated = self._unactuated, None
+                    if prediction is not None:
+                        self._stamp_actuated(prediction, movement)
+            except Exception as e:
+                print(f"Error in head control loop: {e}")
+            time.sleep(max(0.0, TRACK_CONTROL_INTERVAL - (time.time() - started)))
+    
+    def _capture_pose(self, prediction):
+        """Head (yaw, pitch) when the prediction's frame was captured, or None to move relative to now."""
+        capture_time = prediction.get('capture_time')
+        if not LATENCY_COMPENSATION or capture_time is None:
+            return None
+        return self.robot.joint_state.at(capture_time)
+    
+    def _stamp_actuated(self, prediction, movement):
+        self.robot.record_event('head_movement', {'frame_seq': prediction.get('frame_seq'),
+                                                  'movement': movement})
+        if prediction.get('frame_seq') is not None:
+            self.robot.latency.stamp(prediction['frame_seq'], 'actuated')
\ No newline at end of file
@@ -202,6 +202,7 @@ import torch
 import torch.nn as nn
 from config import CENTER_BOX
 from collections import deque
+from models.training_store import TrainingDataStore
 
 class HeadTrackingLSTM(nn.Module):
     def __init__(self, input_size=4, hidden_size=64, output_size=2):
@@ -221,15 +222,17 @@ class HeadTrackingLSTM(nn.Module):
         return output, hidden
 
 class HeadTracker(object):
-    def __init__(self, motion_service):
+    def __init__(self, motion_service, joint_state=None):
         self.motion_service = motion_service
+        # Anything with ALMotion's getAngles; a JointStateCache avoids a round trip per move
+        self.joint_state = joint_state or motion_service
         self.model = HeadTrackingLSTM()
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
         self.criterion = nn.MSELoss()
         
         self.position_history = deque(maxlen=10)
         self.sequence_length = 10
-        self.training_data = []
+        self.training_data = TrainingDataStore()
         
         self.position_to_movement = {
             "Right": [-0.05, 0.0],    
@@ -263,16 +266,16 @@ class HeadTracker(object):
             features = self.normalize_face_position(face_coords)
             movement = self.get_movement_from_position(position)
             if movement is not None:
-                self.training_data.append((features, movement))
+                self.training_data.append(features, movement)
     
     def train_step(self):
         if len(self.training_data) < self.sequence_length:
             return None
             
-        # Prepare sequence
-        features = torch.tensor([sample[0] for sample in self.training_data[-self.sequence_length:]], 
-                              dtype=torch.float32).unsqueeze(0)
-        target = torch.tensor([self.training_data[-1][1]], dtype=torch.float32)
+        # Latest window of the array store
+        windows, targets = self.training_data.windows(self.sequence_length)
+        features = torch.tensor(windows[-1:])
+        target = torch.tensor(targets[-1:])
         
         # Forward pass
         self.optimizer.zero_grad()
@@ -301,7 +304,7 @@ class HeadTracker(object):
             return
             
         try:
-            current_yaw, current_pitch = self.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
+            current_yaw, current_pitch = self.joint_state.getAngles(["HeadYaw", "HeadPitch"], True)
             new_yaw = current_yaw + movement[0]
             new_pitch = current_pitch + movement[1]
             
@@ -333,7 +336,7 @@ def head_relative_to_center(pred, top_left, bottom_right, tracker=None, training
                 movement = tracker.get_movement_from_position(position)
                 if movement is not None:
                     try:
-                        current_yaw, current_pitch = tracker.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
+                        current_yaw, current_pitch = tracker.joint_state.getAngles(["HeadYaw", "HeadPitch"], True)
                         new_yaw = current_yaw + movement[0]
                         new_pitch = current_pitch + movement[1]
                         
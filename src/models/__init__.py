@@ -1,3 +1,8 @@
 # models/__init__.py
 from models.head_tracking import HeadTrackingLSTM, HeadTracker
+from models.visual_servo import VisualServoController, ServoMetrics, camera_angles
+from models.face_filter import FaceKalmanFilter, FaceTrackSet
+from models.trainer import BackgroundTrainer
+from models.training_store import TrainingDataStore
+from models.runtime import LSTMRuntime, load_runtime
 from models.face_position import determine_position, head_relative_to_center
\ No newline at end of file
@@ -0,0 +1,214 @@
+# -*- coding: future_fstrings -*-
+# models/checkpoint.py
+"""Head-tracking checkpoint format.
+
+A checkpoint (version 2) is a directory:
+
+    manifest.json     format, version, sample count, labels, file names, extra metadata
+    weights.pth       model state_dict only
+    optimizer.pth     Adam state, loaded only to continue training
+    features.npy      (n, 4) float32 training features   } opened with mmap_mode='r'
+    targets.npy       (n, 2) float32 movement labels     } only when asked for
+
+Inference reads the manifest and weights and nothing else. Version 1
+checkpoints (a single .pth dict, optionally with a _data.npz beside it)
+still load through the same Checkpoint interface.
+"""
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+import numpy as np
+import torch
+from models.training_store import TrainingDataStore, load_training_data
+
+FORMAT = 'nao-head-tracking'
+FORMAT_VERSION = 2
+FILES = {'weights': 'weights.pth', 'optimizer': 'optimizer.pth',
+         'features': 'features.npy', 'targets': 'targets.npy'}
+
+def is_checkpoint_dir(path):
+    return os.path.isfile(os.path.join(path, 'manifest.json'))
+
+
+class Checkpoint(object):
+    """A saved checkpoint whose parts are loaded only when asked for."""
+
+    def __init__(self, path):
+        self.path = path
+        self._legacy = None
+        if is_checkpoint_dir(path):
+            with open(os.path.join(path, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('version', 0) > FORMAT_VERSION:
+                raise ValueError(f"Checkpoint {path} has version {self.manifest['version']}, "
+                                 f"newer than supported version {FORMAT_VERSION}")
+        else:
+            # Version 1: everything in one pickled dict
+            self._legacy = torch.load(path, map_location='cpu')
+            self.manifest = {
+                'format': FORMAT, 'version': 1,
+                'training_samples': self._legacy.get('training_samples', 0),
+                'position_to_movement': self._legacy.get('position_to_movement'),
+                'extra': {}
+            }
+
+    def _file(self, part):
+        return os.path.join(self.path, self.manifest['files'][part])
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def training_samples(self):
+        return self.manifest.get('training_samples', 0)
+
+    @property
+    def position_to_movement(self):
+        return self.manifest.get('position_to_movement')
+
+    @property
+    def extra(self):
+        return self.manifest.get('extra', {})
+
+    def model_state(self):
+        if self._legacy is not None:
+            return self._legacy['model_state_dict']
+        return torch.load(self._file('weights'), map_location='cpu')
+
+    def optimizer_state(self):
+        if self._legacy is not None:
+            return self._legacy['optimizer_state_dict']
+        return torch.load(self._file('optimizer'), map_location='cpu')
+
+    def training_data(self):
+        """A TrainingDataStore backed by read-only memory maps of the saved arrays."""
+        if self._legacy is not None:
+            return load_training_data(self._legacy, self.path)
+        return TrainingDataStore.from_arrays(np.load(self._file('features'), mmap_mode='r'),
+                                             np.load(self._file('targets'), mmap_mode='r'))
+
+
+def load_checkpoint(path):
+    return Checkpoint(path)
+
+def snapshot_tracker(tracker, extra=None):
+    """Copy everything a checkpoint needs out of a HeadTracker.
+
+    Cheap enough for the GUI thread: tensors are cloned and the training
+    arrays copied, so the tracker and its trainer can carry on while the
+    snapshot is written. While a BackgroundTrainer runs, its private model
+    is saved rather than the last published one, and both it and the
+    optimizer state are copied under the training lock so they come from
+    the same step.
+    """
+    lock = getattr(tracker, 'training_lock', None) or threading.Lock()
+    model = getattr(tracker, 'training_model', None)
+    if model is None:
+        model = tracker.model
+    with lock:
+        model_state = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+        optimizer_state = copy.deepcopy(tracker.optimizer.state_dict())
+    return {
+        'model_state': model_state,
+        'optimizer_state': optimizer_state,
+        'features': np.array(tracker.training_data.features),
+        'targets': np.array(tracker.training_data.targets),
+        'position_to_movement': dict(tracker.position_to_movement),
+        'extra': extra or {}
+    }
+
+def write_checkpoint(path, snapshot):
+    """Write a snapshot as a checkpoint directory.
+
+    Files go to a temporary sibling directory that is renamed into place
+    last, so a crash never leaves a half-written checkpoint at ``path``.
+    An existing checkpoint at ``path`` is moved aside first and deleted
+    only once the new one is in place; after a crash in between it is
+    still there as ``<path>.old``.
+    """
+    path = path[:-len('.pth')] if path.endswith('.pth') else path
+    staging = f"{path}.partial"
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+    torch.save(snapshot['model_state'], os.path.join(staging, FILES['weights']))
+    torch.save(snapshot['optimizer_state'], os.path.join(staging, FILES['optimizer']))
+    np.save(os.path.join(staging, FILES['features']), snapshot['features'])
+    np.save(os.path.join(staging, FILES['targets']), snapshot['targets'])
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'created': time.time(),
+        'training_samples': len(snapshot['features']),
+        'position_to_movement': snapshot['position_to_movement'],
+        'files': FILES,
+        'extra': snapshot['extra']
+    }
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    previous = f"{path}.old"
+    if os.path.exists(path):
+        if os.path.exists(previous):
+            shutil.rmtree(previous)
+        os.rename(path, previous)
+    os.rename(staging, path)
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+    return path
+
+
+class CheckpointSaver(object):
+    """Writes checkpoint snapshots on a background thread, one at a time.
+
+    save() takes the snapshot on the caller's thread and returns at once;
+    ``callback(success, path)`` runs on the saver thread when the write is
+    done.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def save(self, tracker, path, extra=None, callback=None):
+        snapshot = snapshot_tracker(tracker, extra)
+        with self._ready:
+            self._queue.append((snapshot, path, callback))
+            self._ready.notify()
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._queue:
+                    self._ready.wait()
+                snapshot, path, callback = self._queue[0]
+            success = False
+            try:
+                path = write_checkpoint(path, snapshot)
+                success = True
+            except Exception as e:
+                print(f"Error saving model: {e}")
+            with self._ready:
+                self._queue.popleft()
+            if callback is not None:
+                try:
+                    callback(success, path)
+                except Exception as e:
+                    print(f"Error in save callback: {e}")
+
+    def wait(self, timeout=10.0):
+        """Block until queued saves are written, e.g. before exiting."""
+        deadline = time.time() + timeout
+        while self._queue and time.time() < deadline:
+            time.sleep(0.05)
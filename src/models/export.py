@@ -0,0 +1,106 @@
+# -*- coding: future_fstrings -*-
+# models/export.py
+"""Export head-tracking checkpoints to TorchScript.
+
+Run from src/:
+
+    python -m models.export movement_models/* --benchmark 1000
+
+Each checkpoint gets a TorchScript file (model.pt inside its directory, or
+name.pt beside a version 1 .pth file) and a .json recording which weights
+it was traced from. HeadTracker.load_model picks the export up through
+models.runtime, and only while it matches the checkpoint's weights.
+--benchmark compares cold start and per-call latency of eager torch and
+the export on the same input.
+"""
+import glob
+import time
+import numpy as np
+import torch
+from config import SEQUENCE_LENGTH
+from models.head_tracking import HeadTrackingLSTM
+from models.runtime import ExportableLSTM, LSTMRuntime, artifact_paths, write_export_info
+from models.checkpoint import load_checkpoint
+
+def load_eager_model(checkpoint_path):
+    """HeadTrackingLSTM with a checkpoint's weights, in eval mode."""
+    model = HeadTrackingLSTM()
+    model.load_state_dict(load_checkpoint(checkpoint_path).model_state())
+    model.eval()
+    return model
+
+def export_checkpoint(checkpoint_path):
+    """Trace one checkpoint to TorchScript. Returns the path written."""
+    eager = load_eager_model(checkpoint_path)
+    model = ExportableLSTM(eager)
+    model.eval()
+    hidden_size = eager.hidden_size
+    example = (torch.zeros(1, SEQUENCE_LENGTH, 4), torch.zeros(1, 1, hidden_size),
+               torch.zeros(1, 1, hidden_size))
+    path = artifact_paths(checkpoint_path)['torchscript']
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced.save(path)
+    write_export_info(checkpoint_path, eager.state_dict())
+    return path
+
+def _time_calls(run, calls):
+    features = np.random.rand(1, SEQUENCE_LENGTH, 4).astype(np.float32)
+    started = time.time()
+    run(features)
+    first_ms = (time.time() - started) * 1000.0
+    samples = []
+    for _ in range(calls):
+        started = time.time()
+        run(features)
+        samples.append((time.time() - started) * 1000.0)
+    return first_ms, samples
+
+def benchmark(checkpoint_path, calls=1000):
+    """Cold start (load + first call) and per-call latency for every available backend."""
+    results = {}
+
+    started = time.time()
+    model = load_eager_model(checkpoint_path)
+    load_ms = (time.time() - started) * 1000.0
+    def eager(features):
+        with torch.no_grad():
+            return model(torch.from_numpy(features))[0].numpy()
+    first_ms, samples = _time_calls(eager, calls)
+    results['eager'] = (load_ms + first_ms, samples)
+
+    path = artifact_paths(checkpoint_path)['torchscript']
+    try:
+        started = time.time()
+        runtime = LSTMRuntime(path, model.hidden_size)
+        load_ms = (time.time() - started) * 1000.0
+        first_ms, samples = _time_calls(runtime.run, calls)
+        results['torchscript'] = (load_ms + first_ms, samples)
+    except Exception as e:
+        print(f"Skipping torchscript: {e}")
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export head-tracking checkpoints to TorchScript")
+    parser.add_argument('checkpoints', nargs='+', help="Checkpoint directories or .pth files (globs allowed)")
+    parser.add_argument('--benchmark', type=int, default=0, help="Compare eager and exported over this many calls")
+    args = parser.parse_args()
+
+    paths = []
+    for pattern in args.checkpoints:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    for path in paths:
+        try:
+            artifact = export_checkpoint(path)
+        except Exception as e:
+            print(f"Error exporting {path}: {e}")
+            continue
+        print(f"{path} -> {artifact}")
+        if args.benchmark:
+            for backend, (cold_ms, samples) in sorted(benchmark(path, args.benchmark).items()):
+                p50, p99 = np.percentile(samples, [50, 99])
+                print(f"  {backend:12s} cold start {cold_ms:7.1f} ms | per call p50 {p50:.3f} ms, p99 {p99:.3f} ms")
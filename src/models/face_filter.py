@@ -0,0 +1,125 @@
+# -*- coding: future_fstrings -*-
+# models/face_filter.py
+import threading
+import time
+import numpy as np
+from config import FILTER_PROCESS_NOISE, FILTER_MEASUREMENT_NOISE, FILTER_GATE, FILTER_COAST_TIME
+
+class FaceKalmanFilter(object):
+    """Constant-velocity Kalman filter on one face's (yaw, pitch) direction.
+
+    State is [yaw, pitch, yaw_rate, pitch_rate] in radians, in the robot's
+    head-joint frame (head pose at capture + camera angle of the face), so
+    the filter sees the face's own motion rather than motion caused by
+    turning the head. update() takes observations in capture-time order;
+    predict() extrapolates to any later time without changing the state.
+    """
+
+    def __init__(self, observation, timestamp, process_noise=FILTER_PROCESS_NOISE,
+                 measurement_noise=FILTER_MEASUREMENT_NOISE):
+        self.process_noise = process_noise
+        self.x = np.array([observation[0], observation[1], 0.0, 0.0])
+        # Position known to measurement accuracy; velocity unknown
+        self.P = np.diag([measurement_noise ** 2] * 2 + [1.0, 1.0])
+        self.R = np.eye(2) * measurement_noise ** 2
+        self.H = np.hstack([np.eye(2), np.zeros((2, 2))])
+        self.timestamp = timestamp
+        self.last_update = timestamp
+        self.hits = 1
+
+    def _transition(self, dt):
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        # White-noise acceleration, per axis
+        q = self.process_noise
+        block = q * np.array([[dt ** 3 / 3.0, dt ** 2 / 2.0], [dt ** 2 / 2.0, dt]])
+        Q = np.zeros((4, 4))
+        Q[np.ix_([0, 2], [0, 2])] = block
+        Q[np.ix_([1, 3], [1, 3])] = block
+        return F, Q
+
+    def predict(self, timestamp):
+        """(yaw, pitch) expected at ``timestamp``."""
+        dt = max(0.0, timestamp - self.timestamp)
+        return self.x[0] + self.x[2] * dt, self.x[1] + self.x[3] * dt
+
+    def distance(self, observation, timestamp):
+        """Angular distance between an observation and the prediction for its time."""
+        yaw, pitch = self.predict(timestamp)
+        return np.hypot(observation[0] - yaw, observation[1] - pitch)
+
+    def update(self, observation, timestamp):
+        """Fold in an observation of (yaw, pitch) captured at ``timestamp``."""
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            F, Q = self._transition(dt)
+            self.x = F.dot(self.x)
+            self.P = F.dot(self.P).dot(F.T) + Q
+            self.timestamp = timestamp
+        y = np.asarray(observation, dtype=float) - self.H.dot(self.x)
+        S = self.H.dot(self.P).dot(self.H.T) + self.R
+        K = self.P.dot(self.H.T).dot(np.linalg.inv(S))
+        self.x = self.x + K.dot(y)
+        self.P = (np.eye(4) - K.dot(self.H)).dot(self.P)
+        self.last_update = timestamp
+        self.hits += 1
+
+
+class FaceTrackSet(object):
+    """One FaceKalmanFilter per visible face.
+
+    Each batch of observations (all faces in one frame) is matched greedily
+    to the nearest track within ``gate`` radians; unmatched observations
+    start new tracks. A track that gets no observation keeps coasting on its
+    velocity for ``coast_time`` seconds after its last one, which bridges
+    missed detections, and is dropped after that.
+    """
+
+    def __init__(self, gate=FILTER_GATE, coast_time=FILTER_COAST_TIME,
+                 process_noise=FILTER_PROCESS_NOISE, measurement_noise=FILTER_MEASUREMENT_NOISE):
+        self.gate = gate
+        self.coast_time = coast_time
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.tracks = []
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        self.tracks = [t for t in self.tracks if now - t.last_update <= self.coast_time]
+
+    def update(self, observations, timestamp):
+        """Add the (yaw, pitch) observations of every face seen in a frame captured at ``timestamp``."""
+        with self._lock:
+            self._expire(timestamp)
+            unmatched = list(self.tracks)
+            for observation in observations:
+                best = None
+                if unmatched:
+                    best = min(unmatched, key=lambda t: t.distance(observation, timestamp))
+                    if best.distance(observation, timestamp) > self.gate:
+                        best = None
+                if best is None:
+                    self.tracks.append(FaceKalmanFilter(observation, timestamp,
+                                                        self.process_noise, self.measurement_noise))
+                else:
+                    best.update(observation, timestamp)
+                    unmatched.remove(best)
+
+    def primary(self, now=None):
+        """The longest-lived track still within its coast time, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if not self.tracks:
+                return None
+            return max(self.tracks, key=lambda t: (t.hits, t.last_update))
+
+    def predict(self, now=None):
+        """Predicted (yaw, pitch) of the primary face at ``now``, or None if no face is tracked."""
+        now = time.time() if now is None else now
+        track = self.primary(now)
+        return track.predict(now) if track is not None else None
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
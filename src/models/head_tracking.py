@@ -1,10 +1,17 @@
 # -*- coding: future_fstrings -*-
 # models/head_tracking.py
+import threading
 import torch
 import torch.nn as nn
 from collections import deque
 import numpy as np
-from config import SEQUENCE_LENGTH
+from config import SEQUENCE_LENGTH, JOINT_STATE_MAX_AGE, STREAM_CHECK_EVERY, STREAM_CHECK_TOLERANCE
+from config import INFERENCE_RUNTIME
+from utils import clamp_head
+from models.visual_servo import camera_angles
+from models.training_store import TrainingDataStore
+from models.checkpoint import load_checkpoint, snapshot_tracker, write_checkpoint
+from models.runtime import load_runtime, weights_digest
 
 class HeadTrackingLSTM(nn.Module):
     """LSTM model for head tracking and movement prediction."""
@@ -26,16 +33,31 @@ class HeadTrackingLSTM(nn.Module):
 
 class HeadTracker(object):
     """Handles head tracking, training, and movement prediction."""
-    def __init__(self, motion_service):
+    def __init__(self, motion_service, dispatcher=None, joint_state=None, servo=None, face_filter=None):
         self.motion_service = motion_service
+        self.dispatcher = dispatcher  # MotionDispatcher; head moves go through it when set
+        self.joint_state = joint_state  # JointStateCache; avoids a getAngles round trip per move
+        self.servo = servo  # VisualServoController; replaces the model/lookup moves when set
+        self.face_filter = face_filter  # FaceTrackSet; the servo then runs on predicted positions
         self.model = HeadTrackingLSTM()
+        self.runtime = None  # Exported LSTMRuntime for a loaded checkpoint; None runs self.model
+        self.checkpoint = None  # Checkpoint last loaded; its training data stays on disk until needed
+        self.training_lock = threading.Lock()  # Held while the optimizer steps (BackgroundTrainer)
+        self.training_model = None  # BackgroundTrainer's private model, saved instead of self.model
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
         self.criterion = nn.MSELoss()
         
         # Store sequences of face positions
         self.position_history = deque(maxlen=SEQUENCE_LENGTH)
         self.sequence_length = SEQUENCE_LENGTH
-        self.training_data = []
+        self.training_data = TrainingDataStore()
+        
+        # Streaming inference: LSTM state carried across frames
+        self.stream_hidden = None
+        self.stream_steps = 0
+        self.stream_check_every = STREAM_CHECK_EVERY
+        self.stream_check_tolerance = STREAM_CHECK_TOLERANCE
+        self.stream_checks = {'checks': 0, 'max_diff': 0.0, 'resyncs': 0}
         
         # Define standard movements based on face position
         self.position_to_movement = {
@@ -66,26 +88,51 @@ class HeadTracker(object):
         height = (bottom - top) / frame_dims[1]
         return [center_x, center_y, width, height]
     
+    def observe_faces(self, face_locations, frame_dims, capture_time, capture_pose):
+        """Feed a frame's detections into the face filter as head-frame (yaw, pitch).
+        
+        ``capture_pose`` is the head (yaw, pitch) when the frame was taken;
+        the first face also goes into position_history as for the LSTM path.
+        """
+        self.position_history.append(face_locations[0])
+        observations = []
+        for face_coords in face_locations:
+            center_x, center_y, _, _ = self.normalize_face_position(face_coords, frame_dims)
+            yaw, pitch = camera_angles(center_x, center_y)
+            observations.append((capture_pose[0] + yaw, capture_pose[1] + pitch))
+        self.face_filter.update(observations, capture_time)
+    
+    def filtered_step(self, now=None):
+        """One servo step toward the filter's predicted face position.
+        
+        Returns (movement, pose): the step and the head pose it is relative
+        to, or (None, pose) when centred or no face is tracked.
+        """
+        pose = self.joint_state.angles if self.joint_state is not None else None
+        predicted = self.face_filter.predict(now)
+        if pose is None or predicted is None:
+            self.servo.lose()
+            return None, pose
+        error = (predicted[0] - pose[0], predicted[1] - pose[1])
+        return self.servo.step(error, now), pose
+    
     def add_training_sample(self, face_coords, position):
         """Add a new training sample."""
         if face_coords is not None:
             features = self.normalize_face_position(face_coords)
             movement = self.get_movement_from_position(position)
             if movement is not None:
-                self.training_data.append((features, movement))
+                self.training_data.append(features, movement)
     
     def train_step(self):
         """Train on a sequence of samples if enough data is available."""
         if len(self.training_data) < self.sequence_length:
             return None
             
-        # Prepare sequence
-        sequence = [sample[0] for sample in self.training_data[-self.sequence_length:]]
-        target_movement = self.training_data[-1][1]  # Target is the movement for the last frame in sequence
-
-        # Convert to tensor
-        features = torch.tensor(sequence, dtype=torch.float32).unsqueeze(0)
-        target = torch.tensor([target_movement], dtype=torch.float32)
+        # Latest window; its target is the movement for the last frame in the sequence
+        windows, targets = self.training_data.windows(self.sequence_length)
+        features = torch.tensor(windows[-1:])
+        target = torch.tensor(targets[-1:])
         
         # Forward pass
         self.optimizer.zero_grad()
@@ -104,59 +151,151 @@ class HeadTracker(object):
             return None
             
         features = [self.normalize_face_position(coords) for coords in face_coords_sequence]
-        features_tensor = torch.tensor(features, dtype=torch.float32).unsqueeze(0)
+        movement, _ = self._forward(np.array([features], dtype=np.float32))
+        return movement[0].tolist()
+    
+    def _forward(self, features, hidden=None):
+        """LSTM forward on (batch, steps, 4) float32 features; returns (movement array, hidden).
         
+        Uses the exported runtime when one is loaded and falls back to the
+        eager model for good if it fails.
+        """
+        if self.runtime is not None:
+            try:
+                return self.runtime.run(features, hidden)
+            except Exception as e:
+                print(f"Error in {self.runtime.backend} runtime, falling back to eager torch: {e}")
+                self.runtime = None
+        if hidden is not None:
+            hidden = tuple(torch.as_tensor(state) for state in hidden)
         with torch.no_grad():
-            movement, _ = self.model(features_tensor)
-            return movement.squeeze().tolist()
+            movement, hidden = self.model(torch.from_numpy(features), hidden)
+        return movement.numpy(), hidden
 
-    def apply_movement(self, movement):
-        """Apply predicted movement to robot head with safety limits."""
+    def reset_stream(self):
+        """Drop the streaming LSTM state, e.g. when the face track is lost."""
+        self.stream_hidden = None
+        self.stream_steps = 0
+        self.position_history.clear()
+    
+    def predict_movement_step(self, face_coords):
+        """Streaming predict_movement: feed one new observation through the LSTM.
+        
+        The hidden state is kept between calls, so each frame costs one LSTM
+        step instead of a full sequence. Like the batch path, nothing is
+        returned until sequence_length observations have been seen since the
+        last reset_stream(). The carried state remembers the whole track
+        rather than the last sequence_length frames; with stream_check_every
+        set, every N steps the result is compared with predict_movement on
+        position_history and the state is rebuilt from that window when they
+        differ by more than stream_check_tolerance.
+        """
+        self.position_history.append(face_coords)
+        features = np.array([[self.normalize_face_position(face_coords)]], dtype=np.float32)
+        movement, self.stream_hidden = self._forward(features, self.stream_hidden)
+        self.stream_steps += 1
+        if self.stream_steps < self.sequence_length:
+            return None
+        movement = movement[0].tolist()
+        
+        if self.stream_check_every and self.stream_steps % self.stream_check_every == 0:
+            movement = self._check_stream(movement)
+        return movement
+    
+    def _check_stream(self, movement):
+        # Same backend as the streaming steps, so the state it resyncs to is one they can continue
+        window = [self.normalize_face_position(coords) for coords in self.position_history]
+        batch, hidden = self._forward(np.array([window], dtype=np.float32))
+        batch = batch[0].tolist()
+        diff = max(abs(a - b) for a, b in zip(movement, batch))
+        self.stream_checks['checks'] += 1
+        self.stream_checks['max_diff'] = max(self.stream_checks['max_diff'], diff)
+        if diff > self.stream_check_tolerance:
+            # Continue from the bounded-window state instead
+            self.stream_hidden = hidden
+            self.stream_checks['resyncs'] += 1
+            return batch
+        return movement
+    
+    def apply_movement(self, movement, speed=0.1, base_pose=None):
+        """Apply predicted movement to robot head with safety limits.
+        
+        With ``base_pose`` (yaw, pitch at the time the frame was captured) the
+        movement is turned into an absolute target from that pose, so head
+        motion during inference latency is not corrected twice. Without it
+        the movement is relative to the current pose.
+        """
         if movement is None:
             return
+        
+        if base_pose is not None:
+            new_yaw, new_pitch = clamp_head(base_pose[0] + movement[0], base_pose[1] + movement[1])
+            if self.dispatcher is not None:
+                self.dispatcher.set_head_angles(new_yaw, new_pitch, speed)
+            else:
+                try:
+                    self.motion_service.setAngles(["HeadYaw", "HeadPitch"], [new_yaw, new_pitch], speed)
+                except Exception as e:
+                    print(f"Error applying movement: {e}")
+            return
+        
+        if self.dispatcher is not None:
+            self.dispatcher.change_head(movement[0], movement[1], speed)
+            return
             
         try:
-            current_yaw, current_pitch = self.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
-            new_yaw = current_yaw + movement[0]
-            new_pitch = current_pitch + movement[1]
-            
-            # Apply safety limits
-            new_yaw = max(min(new_yaw, 2.0857), -2.0857)  # Yaw limits in radians
-            new_pitch = max(min(new_pitch, 0.5149), -0.6720)  # Pitch limits in radians
+            if self.joint_state is not None:
+                current_yaw, current_pitch = self.joint_state.read(JOINT_STATE_MAX_AGE)
+            else:
+                current_yaw, current_pitch = self.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
+            new_yaw, new_pitch = clamp_head(current_yaw + movement[0], current_pitch + movement[1])
             
             self.motion_service.setAngles(
                 ["HeadYaw", "HeadPitch"],
                 [new_yaw, new_pitch],
-                0.1  # Movement speed
+                speed
             )
         except Exception as e:
             print(f"Error applying movement: {e}")
             
-    def save_model(self, path):
-        """Save the model state and training data."""
+    def save_model(self, path, extra=None):
+        """Save a checkpoint directory (models/checkpoint.py) synchronously.
+        
+        ``extra`` is stored in the manifest, e.g. offline training metadata.
+        The GUI saves through a CheckpointSaver instead, off the Tk thread.
+        """
         try:
-            save_data = {
-                'model_state_dict': self.model.state_dict(),
-                'optimizer_state_dict': self.optimizer.state_dict(),
-                'training_samples': len(self.training_data),
-                'training_data': self.training_data,
-                'position_to_movement': self.position_to_movement
-            }
-            torch.save(save_data, path)
+            write_checkpoint(path, snapshot_tracker(self, extra))
             return True
         except Exception as e:
             print(f"Error saving model: {e}")
             return False
             
-    def load_model(self, path):
-        """Load a previously saved model."""
+    def load_model(self, path, inference=False):
+        """Load a previously saved model.
+        
+        With ``inference`` only the weights are read; the optimizer state and
+        training data are left on disk (see load_training_data()).
+        """
         try:
-            checkpoint = torch.load(path)
-            self.model.load_state_dict(checkpoint['model_state_dict'])
-            self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-            self.training_data = checkpoint['training_data']
-            self.position_to_movement = checkpoint['position_to_movement']
-            return True, checkpoint.get('training_samples', 0)
+            checkpoint = load_checkpoint(path)
+            state = checkpoint.model_state()
+            self.model.load_state_dict(state)
+            if checkpoint.position_to_movement:
+                self.position_to_movement = checkpoint.position_to_movement
+            self.checkpoint = checkpoint
+            if not inference:
+                self.optimizer.load_state_dict(checkpoint.optimizer_state())
+                self.training_data = checkpoint.training_data()
+            # TorchScript export of these weights (models/export.py), if any
+            self.runtime = load_runtime(path, INFERENCE_RUNTIME, self.model.hidden_size, weights_digest(state))
+            return True, checkpoint.training_samples
         except Exception as e:
             print(f"Error loading model: {e}")
-            return False, 0
\ No newline at end of file
+            return False, 0
+    
+    def load_training_data(self):
+        """Map the loaded checkpoint's training data, if load_model skipped it."""
+        if self.checkpoint is not None and not len(self.training_data):
+            self.training_data = self.checkpoint.training_data()
+        return self.training_data
\ No newline at end of file
@@ -0,0 +1,187 @@
+# -*- coding: future_fstrings -*-
+# models/offline_training.py
+"""Train HeadTrackingLSTM offline from saved checkpoints and recorded sessions.
+
+Run from src/:
+
+    python -m models.offline_training movement_models/* ../recordings/session_* \\
+        --epochs 30 --workers 4
+
+Each source is a checkpoint (its training data) or a recording directory
+(its 'inference' events, labelled with the same centre-box lookup the GUI
+uses in training mode). Windows never span two sources. The result is
+saved with HeadTracker.save_model, so HeadTracker.load_model and the GUI
+load it like any live-trained model.
+"""
+import glob
+import os
+import re
+import time
+from datetime import datetime
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+from config import SEQUENCE_LENGTH, MODEL_SAVE_DIR, CENTER_BOX, RESOLUTION_SIZES, VIDEO_RESOLUTION
+from models.head_tracking import HeadTracker
+from models.face_position import determine_position
+from models.training_store import TrainingDataStore
+from models.checkpoint import load_checkpoint, is_checkpoint_dir
+from utils import calculate_frame, rescale_prediction
+
+class WindowDataset(Dataset):
+    """Sequence windows of several TrainingDataStores, indexed as one dataset."""
+
+    def __init__(self, stores, length=SEQUENCE_LENGTH):
+        self.parts = []
+        for store in stores:
+            windows, targets = store.windows(length)
+            if len(windows):
+                self.parts.append((windows, targets))
+        self.offsets = np.cumsum([0] + [len(windows) for windows, _ in self.parts])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index):
+        part = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        windows, targets = self.parts[part]
+        row = index - self.offsets[part]
+        # Copy the strided window out so workers hand back contiguous tensors
+        return torch.from_numpy(np.array(windows[row])), torch.from_numpy(np.array(targets[row]))
+
+
+def load_checkpoint_data(path):
+    """Training samples saved with a checkpoint (memory-mapped for version 2)."""
+    return load_checkpoint(path).training_data()
+
+def load_recording_data(path, tracker):
+    """Label a recording's face detections the way training mode does live."""
+    from utils.recording import SessionPlayer
+    player = SessionPlayer(path)
+    ref_width, ref_height = RESOLUTION_SIZES[VIDEO_RESOLUTION]
+    top_left, bottom_right = calculate_frame(ref_width, ref_height, CENTER_BOX)
+    # Recorded detections are in stream pixels; tracking works in reference pixels
+    factor = ref_width / float(player.width)
+    store = TrainingDataStore()
+    for event in player.events('inference'):
+        prediction = rescale_prediction(event['data'], factor)
+        if not prediction.get('face_locations'):
+            continue
+        face_coords = prediction['face_locations'][0]
+        position = determine_position(face_coords, top_left, bottom_right)
+        movement = tracker.get_movement_from_position(position)
+        if movement is not None:
+            store.append(tracker.normalize_face_position(face_coords), movement)
+    return store
+
+def load_sources(paths, tracker):
+    """One TrainingDataStore per checkpoint file or recording directory."""
+    stores = []
+    for path in paths:
+        try:
+            if os.path.isdir(path) and not is_checkpoint_dir(path):
+                store = load_recording_data(path, tracker)
+            else:
+                store = load_checkpoint_data(path)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        print(f"{path}: {len(store)} samples")
+        stores.append(store)
+    return stores
+
+def next_version(directory):
+    """One more than the highest offline checkpoint version in ``directory``."""
+    versions = [int(match.group(1)) for match in
+                (re.search(r'model_offline_v(\d+)_', name) for name in os.listdir(directory)) if match]
+    return max(versions) + 1 if versions else 1
+
+def run_epoch(model, loader, criterion, optimizer=None):
+    """Mean loss over ``loader``; trains when an optimizer is given."""
+    model.train(optimizer is not None)
+    total, count = 0.0, 0
+    for features, target in loader:
+        with torch.set_grad_enabled(optimizer is not None):
+            output, _ = model(features)
+            loss = criterion(output, target)
+        if optimizer is not None:
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        total += loss.item() * len(features)
+        count += len(features)
+    return total / max(count, 1)
+
+def train(paths, epochs=20, batch_size=64, workers=2, val_split=0.1, lr=0.001, init=None,
+          out_dir=MODEL_SAVE_DIR, seed=0):
+    """Train on every source and save a versioned checkpoint. Returns its path."""
+    torch.manual_seed(seed)
+    tracker = HeadTracker(None)
+    if init:
+        success, _ = tracker.load_model(init)
+        if not success:
+            raise ValueError(f"Could not load initial checkpoint {init}")
+    for group in tracker.optimizer.param_groups:
+        group['lr'] = lr
+
+    stores = load_sources(paths, tracker)
+    dataset = WindowDataset(stores, tracker.sequence_length)
+    if not len(dataset):
+        raise ValueError(f"No training windows of {tracker.sequence_length} samples in the given sources")
+
+    indices = np.random.RandomState(seed).permutation(len(dataset))
+    val_count = int(len(dataset) * val_split)
+    val_set = torch.utils.data.Subset(dataset, indices[:val_count].tolist())
+    train_set = torch.utils.data.Subset(dataset, indices[val_count:].tolist())
+    train_loader = DataLoader(train_set, batch_size=batch_size, shuffle=True, num_workers=workers)
+    val_loader = DataLoader(val_set, batch_size=batch_size, num_workers=workers) if val_count else None
+    print(f"{len(train_set)} training / {val_count} validation windows, {workers} loader workers")
+
+    val_loss = None
+    started = time.time()
+    for epoch in range(1, epochs + 1):
+        train_loss = run_epoch(tracker.model, train_loader, tracker.criterion, tracker.optimizer)
+        val_loss = run_epoch(tracker.model, val_loader, tracker.criterion) if val_loader else None
+        val_text = f" | val {val_loss:.5f}" if val_loss is not None else ""
+        print(f"epoch {epoch}/{epochs}: train {train_loss:.5f}{val_text} ({time.time() - started:.0f}s)")
+    tracker.model.eval()
+
+    # All source samples go into the checkpoint's data file, so it can be retrained again
+    tracker.training_data = TrainingDataStore()
+    for store in stores:
+        tracker.training_data.extend(store.features, store.targets)
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    version = next_version(out_dir)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(out_dir, f"model_offline_v{version}_samplesize_{len(tracker.training_data)}_{stamp}")
+    info = {'version': version, 'sources': list(paths), 'epochs': epochs, 'val_loss': val_loss}
+    if not tracker.save_model(path, info):
+        raise IOError(f"Could not save {path}")
+    return path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the head-tracking LSTM offline")
+    parser.add_argument('sources', nargs='+', help="Checkpoints and/or recording directories (globs allowed)")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2, help="DataLoader worker processes")
+    parser.add_argument('--val-split', type=float, default=0.1, help="Fraction of windows held out")
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--init', help="Checkpoint to start from instead of fresh weights")
+    parser.add_argument('--out-dir', default=MODEL_SAVE_DIR)
+    parser.add_argument('--threads', type=int, default=0, help="torch intra-op threads (0 keeps the default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    sources = []
+    for pattern in args.sources:
+        sources.extend(sorted(glob.glob(pattern)) or [pattern])
+    path = train(sources, args.epochs, args.batch_size, args.workers, args.val_split, args.lr,
+                 args.init, args.out_dir)
+    print(f"Saved {path}")
@@ -0,0 +1,111 @@
+# -*- coding: future_fstrings -*-
+# models/runtime.py
+import hashlib
+import json
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+
+class ExportableLSTM(nn.Module):
+    """HeadTrackingLSTM with the hidden state as explicit tensors in and out.
+
+    Tracing needs plain tensor inputs, and taking (h, c) lets one
+    exported graph serve both the batch path (zeros) and streaming steps.
+    """
+    def __init__(self, model):
+        super(ExportableLSTM, self).__init__()
+        self.model = model
+
+    def forward(self, x, h, c):
+        output, (h, c) = self.model(x, (h, c))
+        return output, h, c
+
+
+def artifact_paths(checkpoint_path):
+    """TorchScript file exported for a checkpoint, and the file recording its weights.
+
+    Inside a checkpoint directory: model.pt, model.json. Beside a version 1
+    file: name.pth -> name.pt, name.json.
+    """
+    if os.path.isdir(checkpoint_path):
+        base = os.path.join(checkpoint_path, 'model')
+    else:
+        base = os.path.splitext(checkpoint_path)[0]
+    return {'torchscript': base + '.pt', 'info': base + '.json'}
+
+def weights_digest(state_dict):
+    """SHA-1 of a model state_dict's names and values, to match exports to weights."""
+    digest = hashlib.sha1()
+    for name in sorted(state_dict):
+        digest.update(name.encode('utf-8'))
+        digest.update(state_dict[name].detach().cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+def write_export_info(checkpoint_path, state_dict):
+    with open(artifact_paths(checkpoint_path)['info'], 'w') as f:
+        json.dump({'weights_sha1': weights_digest(state_dict)}, f)
+
+def export_matches(checkpoint_path, digest):
+    """True if the checkpoint's export was traced from weights with this digest."""
+    try:
+        with open(artifact_paths(checkpoint_path)['info']) as f:
+            return json.load(f).get('weights_sha1') == digest
+    except (IOError, OSError, ValueError):
+        return False
+
+
+class LSTMRuntime(object):
+    """Runs an exported (TorchScript) head-tracking LSTM on numpy inputs.
+
+    run() takes float32 features of shape (batch, steps, 4) and an optional
+    (h, c) state and returns the movement (batch, 2) and the new state, so
+    it covers both HeadTracker.predict_movement and the streaming step.
+    """
+
+    def __init__(self, path, hidden_size=64):
+        self.backend = 'torchscript'
+        self.path = path
+        self.hidden_size = hidden_size
+        self.module = torch.jit.load(path)
+        self.module.eval()
+
+    def zero_state(self, batch_size=1):
+        shape = (1, batch_size, self.hidden_size)
+        return np.zeros(shape, dtype=np.float32), np.zeros(shape, dtype=np.float32)
+
+    def run(self, features, hidden=None):
+        features = np.asarray(features, dtype=np.float32)
+        if hidden is None:
+            h, c = self.zero_state(features.shape[0])
+        else:
+            # State may come from the eager model as tensors
+            h, c = [np.asarray(state, dtype=np.float32) for state in hidden]
+        with torch.no_grad():
+            output, h, c = self.module(torch.from_numpy(features), torch.from_numpy(h), torch.from_numpy(c))
+        return output.numpy(), (h.numpy(), c.numpy())
+
+
+def load_runtime(checkpoint_path, preference='auto', hidden_size=64, digest=None):
+    """The TorchScript runtime exported for a checkpoint, or None for eager torch.
+
+    ``preference`` is 'auto' or 'torchscript' (use the export if there is
+    one) or 'eager'. With ``digest`` (weights_digest of the weights just
+    loaded) an export traced from other weights is ignored, e.g. a stale
+    name.pt beside a .pth. Missing or unloadable exports fall back to None.
+    """
+    if preference == 'eager' or not checkpoint_path:
+        return None
+    path = artifact_paths(checkpoint_path)['torchscript']
+    if not os.path.exists(path):
+        return None
+    if digest is not None and not export_matches(checkpoint_path, digest):
+        print(f"Ignoring {path}: exported from different weights; re-run models/export.py")
+        return None
+    try:
+        runtime = LSTMRuntime(path, hidden_size)
+        print(f"Head tracking model running on torchscript: {path}")
+        return runtime
+    except Exception as e:
+        print(f"Error loading torchscript model {path}: {e}")
+    return None
@@ -0,0 +1,130 @@
+# -*- coding: future_fstrings -*-
+# models/trainer.py
+import copy
+import threading
+import time
+from collections import deque
+import numpy as np
+import torch
+from config import TRAINER_BUFFER_SIZE, TRAINER_BATCH_SIZE, TRAINER_INTERVAL, TRAINER_PUBLISH_EVERY
+
+class BackgroundTrainer(object):
+    """Trains a HeadTracker's LSTM on its own thread from a replay buffer.
+
+    The replay buffer is the newest ``buffer_size`` sequence windows of
+    ``tracker.training_data`` (a TrainingDataStore), read as strided views
+    with the same window/target pairing as HeadTracker.train_step. Each step
+    trains on a random mini-batch of those windows, at most once per
+    ``interval`` seconds.
+
+    Training happens on a private copy of the model. Every ``publish_every``
+    steps a snapshot of it replaces ``tracker.model`` with a single
+    attribute assignment, so inference always sees a complete set of
+    weights and never waits on a training step.
+    """
+
+    def __init__(self, tracker, buffer_size=TRAINER_BUFFER_SIZE, batch_size=TRAINER_BATCH_SIZE,
+                 interval=TRAINER_INTERVAL, publish_every=TRAINER_PUBLISH_EVERY):
+        self.tracker = tracker
+        self.batch_size = batch_size
+        self.interval = interval
+        self.publish_every = publish_every
+        self.buffer_size = buffer_size
+
+        self.model = copy.deepcopy(tracker.model)
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
+        # Continue the tracker's optimizer state (e.g. from a loaded checkpoint)
+        self.optimizer.load_state_dict(tracker.optimizer.state_dict())
+        tracker.optimizer = self.optimizer  # So save_model stores the state being trained
+        tracker.runtime = None  # Exported graphs would not see the published weights
+        # Shared with checkpoint snapshots; the legacy head_movement tracker has no lock of its own
+        self.lock = getattr(tracker, 'training_lock', None) or threading.Lock()
+        tracker.training_lock = self.lock
+        tracker.training_model = self.model  # The weights tracker.optimizer's state belongs to
+
+        self.steps = 0
+        self.published = 0
+        self.loss = None
+        self.started = time.time()
+        self._rate_window = deque(maxlen=50)  # (time, windows) per step
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        self.publish()
+
+    def _replay_windows(self):
+        """Strided views of the newest ``buffer_size`` windows and their targets."""
+        windows, targets = self.tracker.training_data.windows(self.tracker.sequence_length)
+        return windows[-self.buffer_size:], targets[-self.buffer_size:]
+
+    def _run(self):
+        while self.running:
+            started = time.time()
+            try:
+                windows, targets = self._replay_windows()
+                if len(windows) >= self.batch_size:
+                    self.train_batch(windows, targets)
+            except Exception as e:
+                print(f"Error in background training: {e}")
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def train_batch(self, windows, targets):
+        """One Adam step on a random mini-batch of the given windows. Returns the loss."""
+        batch = np.random.choice(len(windows), min(self.batch_size, len(windows)), replace=False)
+        # Fancy indexing gathers just this batch out of the strided views
+        features = torch.from_numpy(windows[batch])
+        target = torch.from_numpy(targets[batch])
+
+        with self.lock:
+            self.optimizer.zero_grad()
+            output, _ = self.model(features)
+            loss = self.tracker.criterion(output, target)
+            loss.backward()
+            self.optimizer.step()
+            self.steps += 1
+            self.loss = loss.item()
+
+        self._rate_window.append((time.time(), len(batch)))
+        if self.steps % self.publish_every == 0:
+            self.publish()
+        return self.loss
+
+    def publish(self):
+        """Swap a snapshot of the trained weights into the tracker's inference path."""
+        with self.lock:
+            snapshot = copy.deepcopy(self.model)
+        snapshot.eval()
+        self.tracker.model = snapshot
+        self.published += 1
+
+    def snapshot(self):
+        """Training progress for the status panel."""
+        rate = list(self._rate_window)
+        steps_per_s = windows_per_s = 0.0
+        if len(rate) > 1:
+            elapsed = max(rate[-1][0] - rate[0][0], 1e-6)
+            steps_per_s = (len(rate) - 1) / elapsed
+            windows_per_s = sum(count for _, count in rate[1:]) / elapsed
+        return {
+            'samples': len(self.tracker.training_data),
+            'buffer': min(self.buffer_size, max(0, len(self.tracker.training_data)
+                                                - self.tracker.sequence_length + 1)),
+            'steps': self.steps,
+            'published': self.published,
+            'loss': self.loss,
+            'steps_per_s': steps_per_s,
+            'windows_per_s': windows_per_s
+        }
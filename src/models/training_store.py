@@ -0,0 +1,135 @@
+# -*- coding: future_fstrings -*-
+# models/training_store.py
+import os
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+class TrainingDataStore(object):
+    """Growable float32 arrays of training features and target movements.
+
+    Row ``i`` holds one sample: ``features[i]`` (normalize_face_position
+    output) and ``targets[i]`` (the movement label). Appends write into
+    preallocated rows and double the capacity when full, so they are O(1)
+    amortised. windows() returns every sequence window as a strided view of
+    the feature array, without copying; slicing a contiguous run of windows
+    is still a view, and fancy-indexing a batch copies only that batch.
+
+    Each sample takes 24 bytes, against several hundred for a tuple of two
+    lists of Python floats. Data is saved to .npz, apart from the weights.
+    """
+
+    def __init__(self, feature_size=4, target_size=2, capacity=1024):
+        self._features = np.zeros((capacity, feature_size), dtype=np.float32)
+        self._targets = np.zeros((capacity, target_size), dtype=np.float32)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def _grow(self):
+        capacity = max(1024, 2 * len(self._features))
+        for name in ('_features', '_targets'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=np.float32)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def append(self, features, target):
+        """Add one sample."""
+        with self._lock:
+            if self._count == len(self._features):
+                self._grow()
+            self._features[self._count] = features
+            self._targets[self._count] = target
+            self._count += 1
+
+    def extend(self, features, targets):
+        """Add many samples at once, e.g. from another store or an old checkpoint."""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self._features.shape[1])
+        targets = np.asarray(targets, dtype=np.float32).reshape(-1, self._targets.shape[1])
+        with self._lock:
+            while self._count + len(features) > len(self._features):
+                self._grow()
+            end = self._count + len(features)
+            self._features[self._count:end] = features
+            self._targets[self._count:end] = targets
+            self._count = end
+
+    @property
+    def features(self):
+        """(n, feature_size) view of the stored features."""
+        with self._lock:
+            return self._features[:self._count]
+
+    @property
+    def targets(self):
+        """(n, target_size) view of the stored targets."""
+        with self._lock:
+            return self._targets[:self._count]
+
+    def windows(self, length):
+        """(features, targets) for every window of ``length`` consecutive samples.
+
+        features is a read-only (n - length + 1, length, feature_size) strided
+        view; targets[i] is the label of the last sample in window i, the
+        pairing HeadTracker.train_step uses.
+        """
+        with self._lock:
+            features = self._features[:self._count]
+            targets = self._targets[:self._count]
+        count = max(0, len(features) - length + 1)
+        row, column = features.strides
+        windows = as_strided(features, shape=(count, length, features.shape[1]),
+                             strides=(row, row, column), writeable=False)
+        return windows, targets[length - 1:]
+
+    def save(self, path):
+        """Write the samples to an .npz file at ``path``."""
+        np.savez(path, features=self.features, targets=self.targets)
+
+    @classmethod
+    def load(cls, path):
+        """Read a store written by save()."""
+        data = np.load(path)
+        store = cls(data['features'].shape[1], data['targets'].shape[1], max(1024, len(data['features'])))
+        store.extend(data['features'], data['targets'])
+        return store
+
+    @classmethod
+    def from_arrays(cls, features, targets):
+        """Wrap existing arrays, e.g. read-only memory maps, without copying.
+
+        The first append copies them into a growable in-memory buffer.
+        """
+        store = cls(features.shape[1], targets.shape[1], capacity=0)
+        store._features = features
+        store._targets = targets
+        store._count = len(features)
+        return store
+
+    @classmethod
+    def from_samples(cls, samples):
+        """Build a store from the old list of (features, movement) tuples."""
+        store = cls(capacity=max(1024, len(samples)))
+        if samples:
+            features, targets = zip(*samples)
+            store.extend(features, targets)
+        return store
+
+
+def data_path_for(checkpoint_path):
+    """The .npz file saved next to a checkpoint: model.pth -> model_data.npz."""
+    return os.path.splitext(checkpoint_path)[0] + '_data.npz'
+
+def load_training_data(checkpoint, checkpoint_path):
+    """Training samples for a loaded checkpoint dict, as a TrainingDataStore.
+
+    Newer checkpoints name their .npz file in 'training_data_file' (relative
+    to the checkpoint); older ones pickled the sample list as 'training_data'.
+    """
+    data_file = checkpoint.get('training_data_file')
+    if data_file:
+        return TrainingDataStore.load(os.path.join(os.path.dirname(checkpoint_path), data_file))
+    return TrainingDataStore.from_samples(checkpoint.get('training_data', []))
@@ -0,0 +1,145 @@
+# -*- coding: future_fstrings -*-
+# models/visual_servo.py
+import math
+import time
+from config import CAMERA_HFOV, CAMERA_VFOV, SERVO_GAINS, SERVO_DEADBAND, SERVO_MAX_STEP, SERVO_MAX_RATE
+
+def camera_angles(center_x, center_y, hfov=CAMERA_HFOV, vfov=CAMERA_VFOV):
+    """Yaw/pitch (radians) from the optical axis to a normalised image point.
+
+    ``center_x``/``center_y`` are in [0, 1] as from
+    HeadTracker.normalize_face_position. Positive yaw is to the left and
+    positive pitch is down, as for NAO's head joints, so adding the result
+    to the head pose points the head at the point.
+    """
+    yaw = -math.atan((2.0 * center_x - 1.0) * math.tan(math.radians(hfov) / 2.0))
+    pitch = math.atan((2.0 * center_y - 1.0) * math.tan(math.radians(vfov) / 2.0))
+    return yaw, pitch
+
+
+class ServoMetrics(object):
+    """Time-to-centre and overshoot per engagement.
+
+    An engagement starts when a face is first seen outside the deadband and
+    ends when it is back inside it (or the face is lost). Overshoot is the
+    largest error past the centre, on the opposite side from where the face
+    started, as a fraction of the starting error.
+    """
+
+    def __init__(self):
+        self.completed = []  # (seconds, updates, overshoot) per centred engagement; updates are
+                             # detections, or control ticks when a face filter drives the servo
+        self.lost = 0
+        self._active = None
+
+    def observe(self, error, centred, now):
+        """Record one control update with the angular ``error`` (yaw, pitch)."""
+        active = self._active
+        if active is None:
+            if not centred:
+                self._active = {'start': now, 'frames': 1, 'initial': error, 'overshoot': 0.0}
+            return
+        active['frames'] += 1
+        for initial, current in zip(active['initial'], error):
+            # Error of opposite sign to the starting error means we went past the centre
+            if abs(initial) > 1e-6 and initial * current < 0:
+                active['overshoot'] = max(active['overshoot'], abs(current) / abs(initial))
+        if centred:
+            self.completed.append((now - active['start'], active['frames'], active['overshoot']))
+            self._active = None
+
+    def lose(self):
+        """The face disappeared before it was centred."""
+        if self._active is not None:
+            self.lost += 1
+            self._active = None
+
+    def snapshot(self):
+        count = len(self.completed)
+        if not count:
+            return {'engagements': 0, 'lost': self.lost}
+        seconds, frames, overshoot = zip(*self.completed)
+        return {
+            'engagements': count,
+            'lost': self.lost,
+            'time_to_centre': sum(seconds) / count,
+            'frames_to_centre': sum(frames) / float(count),
+            'overshoot': sum(overshoot) / count,
+            'max_overshoot': max(overshoot)
+        }
+
+
+class VisualServoController(object):
+    """PID controller from the face centre's pixel offset to head angle steps.
+
+    The pixel offset from the image centre is converted to an angle through
+    the camera's field of view (pinhole model), so the proportional term
+    alone with a gain of 1.0 would turn the head straight onto the face.
+    Inside the deadband no command is sent. Each step is limited by
+    ``max_rate`` (rad/s times the time since the last update) and
+    ``max_step``, which keeps a late or noisy detection from swinging the
+    head.
+
+    update() returns [yaw_change, pitch_change] in the same convention as
+    HeadTracker.position_to_movement, or None when the face is centred.
+    """
+
+    def __init__(self, gains=SERVO_GAINS, deadband=SERVO_DEADBAND, max_step=SERVO_MAX_STEP,
+                 max_rate=SERVO_MAX_RATE, hfov=CAMERA_HFOV, vfov=CAMERA_VFOV):
+        self.kp, self.ki, self.kd = gains
+        self.deadband = deadband
+        self.max_step = max_step
+        self.max_rate = max_rate
+        self.hfov = hfov
+        self.vfov = vfov
+        self.metrics = ServoMetrics()
+        self.reset()
+
+    def reset(self):
+        """Forget the integral and derivative state, e.g. when the face is lost."""
+        self._integral = [0.0, 0.0]
+        self._previous_error = None
+        self._previous_time = None
+
+    def angular_error(self, face_coords, frame_dims):
+        """Yaw/pitch (radians) that would bring the face centre to the image centre."""
+        top, right, bottom, left = face_coords
+        width, height = frame_dims
+        center_x = (left + right) / 2.0 / width
+        center_y = (top + bottom) / 2.0 / height
+        return camera_angles(center_x, center_y, self.hfov, self.vfov)
+
+    def update(self, face_coords, frame_dims, now=None):
+        """One control step for a detection in a ``frame_dims`` (width, height) image."""
+        return self.step(self.angular_error(face_coords, frame_dims), now)
+
+    def step(self, error, now=None):
+        """One control step for an angular (yaw, pitch) error, e.g. from a filtered face track."""
+        now = time.time() if now is None else now
+        centred = all(abs(e) <= self.deadband for e in error)
+        self.metrics.observe(error, centred, now)
+        if centred:
+            self.reset()
+            return None
+
+        dt = now - self._previous_time if self._previous_time is not None else None
+        step = []
+        for axis, e in enumerate(error):
+            output = self.kp * e
+            if dt:
+                self._integral[axis] += e * dt
+                output += self.ki * self._integral[axis]
+                output += self.kd * (e - self._previous_error[axis]) / dt
+            limit = self.max_step if not dt else min(self.max_step, self.max_rate * dt)
+            step.append(max(-limit, min(limit, output)))
+        self._previous_error = error
+        self._previous_time = now
+        return step
+
+    def lose(self):
+        """No face this frame: stop accumulating and close the open engagement."""
+        self.metrics.lose()
+        self.reset()
+
+    def snapshot(self):
+        return self.metrics.snapshot()
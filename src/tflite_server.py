@@ -1,16 +1,29 @@
 import os
 import json
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-import tensorflow as tf
 import logging
 import base64
 from flask import Flask, request, jsonify
 import numpy as np
 import cv2
 import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from ultralytics import YOLO
 import face_recognition
 
+# Prefer the standalone tflite_runtime interpreter; only pull in full TensorFlow if it is missing
+try:
+    from tflite_runtime.interpreter import Interpreter
+    TFLITE_BACKEND = 'tflite_runtime'
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+    TFLITE_BACKEND = 'tensorflow'
+
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 log = logging.getLogger('werkzeug')
@@ -20,11 +33,11 @@ app = Flask(__name__)
 
 # Load models at startup
 try:
-    interpreter = tf.lite.Interpreter(model_path="./../models/peekaboo_model.tflite")
+    interpreter = Interpreter(model_path="./../models/peekaboo_model.tflite")
     interpreter.allocate_tensors()
     input_details = interpreter.get_input_details()
     output_details = interpreter.get_output_details()
-    print("TFLite model loaded successfully")
+    print(f"TFLite model loaded successfully ({TFLITE_BACKEND})")
 except Exception as e:
     print(f"Error loading TFLite model: {str(e)}")
     interpreter = None
@@ -36,28 +49,132 @@ except Exception as e:
     print(f"Error loading YOLO model: {str(e)}")
     yolo_model = None
 
-def preprocess_image(image):
-    """Preprocess the image to fit the TensorFlow Lite model's input size."""
-    image_resized = cv2.resize(image, (224, 224))
-    image_normalized = image_resized.astype('float32') / 255.0
-    image_reshaped = np.expand_dims(image_normalized, axis=0)
-    return image_reshaped
+class BufferPool:
+    """Pool of reusable numpy buffers keyed by shape and dtype.
+
+    Flask serves each request on its own thread, so buffers are handed out
+    under a lock and returned to a free list instead of being thread-local.
+    """
+
+    def __init__(self):
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+        return np.empty(key[0], dtype=dtype)
+
+    def release(self, buf):
+        key = (buf.shape, buf.dtype.str)
+        with self._lock:
+            self._free.setdefault(key, []).append(buf)
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        buf = self.acquire(shape, dtype)
+        try:
+            yield buf
+        finally:
+            self.release(buf)
+
+buffer_pool = BufferPool()
+# The interpreter and its input tensor are shared state, so only one request may use them at a time
+tflite_lock = threading.Lock()
+
+# Downscale factor each model works at; 1 means full resolution
+MODEL_DECODE_SCALE = {'tflite': 1, 'yolo': 1, 'face': 2}
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+class FrameView:
+    """A request image decoded once and shared between the models.
+
+    ``images`` maps downscale factor to decoded array. JPEG decoding can
+    produce a 1/2, 1/4 or 1/8 image directly from the DCT coefficients, so
+    when every consumer of a request works on a downscaled image the full
+    resolution frame is never materialized.
+    """
+
+    def __init__(self, image_bytes, scale=1):
+        encoded = np.frombuffer(image_bytes, dtype=np.uint8)
+        self.images = {}
+        self._borrowed = []
+        image = cv2.imdecode(encoded, REDUCED_DECODE_FLAGS[scale])
+        if image is not None:
+            self.images[scale] = image
+
+    @property
+    def scales(self):
+        """Downscale factors currently available without further work."""
+        return sorted(self.images)
+
+    def get(self, scale=1):
+        """Return the image at ``scale``, downscaling a finer one if needed."""
+        if scale in self.images:
+            return self.images[scale]
+        finer = [s for s in self.images if s < scale]
+        if not finer:
+            raise ValueError(f"Scale {scale} not available (decoded at {self.scales})")
+        source_scale = max(finer)
+        source = self.images[source_scale]
+        factor = source_scale / scale
+        height, width = source.shape[:2]
+        shape = (int(round(height * factor)), int(round(width * factor)), 3)
+        image = buffer_pool.acquire(shape)
+        self._borrowed.append(image)
+        cv2.resize(source, (shape[1], shape[0]), dst=image, interpolation=cv2.INTER_AREA)
+        self.images[scale] = image
+        return image
+
+    def release(self):
+        """Return derived images to the buffer pool."""
+        for image in self._borrowed:
+            buffer_pool.release(image)
+        self._borrowed = []
+        self.images = {}
+
+def preprocess_image(image, out=None):
+    """Preprocess the image to fit the TensorFlow Lite model's input size.
+
+    The normalized image is written into ``out`` (e.g. the interpreter's input
+    tensor view) when given, otherwise into a newly allocated array.
+    """
+    if out is None:
+        out = np.empty((1, 224, 224, 3), dtype=np.float32)
+    height, width = out.shape[1:3]
+    with buffer_pool.borrow((height, width, 3)) as image_resized:
+        cv2.resize(image, (width, height), dst=image_resized)
+        np.divide(image_resized, np.float32(255.0), out=out[0], dtype=np.float32)
+    return out
 
 def predict_tflite(image):
     """Run inference using the TensorFlow Lite model."""
     try:
-        interpreter.set_tensor(input_details[0]['index'], image)
-        interpreter.invoke()
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+        with tflite_lock:
+            # Write straight into the interpreter's input buffer; the view must be
+            # dropped before invoke() or the interpreter refuses to run
+            input_view = interpreter.tensor(input_details[0]['index'])()
+            preprocess_image(image, out=input_view)
+            del input_view
+            interpreter.invoke()
+            output_data = interpreter.get_tensor(output_details[0]['index'])
         return output_data
     except Exception as e:
         print(f"Error in TFLite prediction: {str(e)}")
         return None
 
-def predict_yolo(image):
-    """Run YOLO object detection."""
+def predict_yolo(image, model=None):
+    """Run YOLO object detection (with the primary model unless ``model`` is given)."""
     try:
-        results = yolo_model(image)
+        results = (model or yolo_model)(image)
         predictions = []
         
         for result in results:
@@ -79,23 +196,22 @@ def predict_yolo(image):
         print(f"Error in YOLO prediction: {str(e)}")
         return None
 
-def detect_faces(image):
-    """Run face detection and return face locations."""
+def detect_faces(frame, scale=MODEL_DECODE_SCALE['face']):
+    """Run face detection on a FrameView and return full-resolution face locations."""
     try:
-        # Resize image for faster detection but keep it larger than before
-        small_frame = cv2.resize(image, (0, 0), fx=0.5, fy=0.5)
+        # Detect on a downscaled image for speed; decoded directly at this scale when possible
+        small_frame = frame.get(scale)
+        with buffer_pool.borrow(small_frame.shape) as rgb_small_frame:
+            # Convert BGR to RGB (simplified)
+            cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB, dst=rgb_small_frame)
 
-        # Convert BGR to RGB (simplified)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        
-        face_locations = face_recognition.face_locations(
-            rgb_small_frame,
-            model="hog",  
-            number_of_times_to_upsample=1  # Reduced for speed
-        )
+            face_locations = face_recognition.face_locations(
+                rgb_small_frame,
+                model="hog",
+                number_of_times_to_upsample=1  # Reduced for speed
+            )
         
         # Scale back up face locations
-        scale = 2  # Since we used fx=0.5
         face_locations_full = [
             [int(top * scale), int(right * scale), 
              int(bottom * scale), int(left * scale)]
@@ -107,6 +223,209 @@ def detect_faces(image):
         print(f"Error in face detection: {str(e)}")
         return []
 
+# Shadow evaluation: mirror a sample of live frames to candidate models in the background
+SHADOW_TFLITE_MODEL = os.environ.get('SHADOW_TFLITE_MODEL')   # e.g. ./../models/peekaboo_model_v2.tflite
+SHADOW_YOLO_MODEL = os.environ.get('SHADOW_YOLO_MODEL')       # e.g. ./../models/yolov7.pt
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', '0.1'))
+SHADOW_MAX_PENDING = int(os.environ.get('SHADOW_MAX_PENDING', '4'))
+SHADOW_NICENESS = 10
+
+def _lower_thread_priority():
+    """Renice the calling worker thread so shadow work yields to live requests (Linux only)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SHADOW_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+def make_tflite_predictor(model_path):
+    """Load a candidate TFLite model and return a predict(image) function for it."""
+    candidate = Interpreter(model_path=model_path, num_threads=1)
+    candidate.allocate_tensors()
+    input_index = candidate.get_input_details()[0]['index']
+    output_index = candidate.get_output_details()[0]['index']
+
+    def predict(image):
+        input_view = candidate.tensor(input_index)()
+        preprocess_image(image, out=input_view)
+        del input_view
+        candidate.invoke()
+        return candidate.get_tensor(output_index)
+    return predict
+
+def box_iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes."""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def yolo_agreement(primary, candidate, iou_threshold=0.5):
+    """Fraction of detections matched by class and IoU between two YOLO outputs."""
+    if not primary and not candidate:
+        return 1.0
+    unmatched = list(candidate)
+    matches = 0
+    for p in primary:
+        for c in unmatched:
+            if c['class'] == p['class'] and box_iou(p['bounding_box'], c['bounding_box']) >= iou_threshold:
+                unmatched.remove(c)
+                matches += 1
+                break
+    return matches / max(len(primary), len(candidate))
+
+class ShadowStats:
+    """Rolling latency and agreement statistics for one candidate model."""
+
+    def __init__(self, window=1000):
+        self.primary_ms = deque(maxlen=window)
+        self.candidate_ms = deque(maxlen=window)
+        self.agreement = deque(maxlen=window)
+        self.samples = 0
+        self.errors = 0
+        # record() runs on the shadow worker while summary() serves the stats endpoint
+        self.lock = threading.Lock()
+
+    def record(self, primary_ms, candidate_ms, agreement):
+        with self.lock:
+            self.samples += 1
+            self.primary_ms.append(primary_ms)
+            self.candidate_ms.append(candidate_ms)
+            self.agreement.append(agreement)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    @staticmethod
+    def _latency(values):
+        if not values:
+            return None
+        p50, p95 = np.percentile(values, [50, 95])
+        return {'mean': float(np.mean(values)), 'p50': float(p50), 'p95': float(p95)}
+
+    def summary(self):
+        with self.lock:
+            samples, errors = self.samples, self.errors
+            primary_ms = list(self.primary_ms)
+            candidate_ms = list(self.candidate_ms)
+            agreement = list(self.agreement)
+        return {
+            'samples': samples,
+            'errors': errors,
+            'primary_latency_ms': self._latency(primary_ms),
+            'candidate_latency_ms': self._latency(candidate_ms),
+            'agreement': float(np.mean(agreement)) if agreement else None
+        }
+
+class ShadowEvaluator:
+    """Runs candidate models on a sample of live frames without touching the response path.
+
+    Sampled requests hand over their encoded bytes, primary results and
+    primary timings; decoding and candidate inference happen on a single
+    reniced worker thread. If the worker falls behind, samples are dropped
+    rather than queued.
+    """
+
+    def __init__(self, candidates, sample_rate=SHADOW_SAMPLE_RATE, max_pending=SHADOW_MAX_PENDING):
+        self.candidates = candidates
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.stats = {name: ShadowStats() for name in candidates}
+        self.pending = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow',
+                                           initializer=_lower_thread_priority)
+
+    def maybe_submit(self, image_bytes, response, timings):
+        """Queue a frame for shadow evaluation if it is sampled and there is room."""
+        models = [name for name in self.candidates if name in timings]
+        if not models or random.random() >= self.sample_rate:
+            return False
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending += 1
+        self.executor.submit(self._evaluate, models, image_bytes, response, dict(timings))
+        return True
+
+    def _evaluate(self, models, image_bytes, response, timings):
+        frame = FrameView(image_bytes, scale=1)
+        try:
+            for name in models:
+                stats = self.stats[name]
+                try:
+                    start = time.perf_counter()
+                    result = self.candidates[name](frame.get(1))
+                    candidate_ms = (time.perf_counter() - start) * 1000.0
+                except Exception as e:
+                    print(f"Error in shadow {name} prediction: {str(e)}")
+                    result = None
+                if result is None:
+                    stats.record_error()
+                    continue
+
+                if name == 'tflite':
+                    if 'tflite_prediction' not in response:
+                        continue
+                    primary_score = response['tflite_prediction'][0][0]
+                    agreement = float((primary_score < 0.5) == (float(result[0][0]) < 0.5))
+                else:
+                    if 'yolo_prediction' not in response:
+                        continue
+                    agreement = yolo_agreement(response['yolo_prediction'], result)
+                stats.record(timings[name], candidate_ms, agreement)
+        finally:
+            frame.release()
+            with self.lock:
+                self.pending -= 1
+
+    def summary(self):
+        with self.lock:
+            summary = {'sample_rate': self.sample_rate, 'pending': self.pending, 'dropped': self.dropped}
+        summary['models'] = {name: stats.summary() for name, stats in self.stats.items()}
+        return summary
+
+def load_shadow_evaluator():
+    """Build the shadow evaluator from the SHADOW_* settings, or None if no candidate is set."""
+    candidates = {}
+    if SHADOW_TFLITE_MODEL:
+        try:
+            candidates['tflite'] = make_tflite_predictor(SHADOW_TFLITE_MODEL)
+            print(f"Shadow TFLite model loaded: {SHADOW_TFLITE_MODEL}")
+        except Exception as e:
+            print(f"Error loading shadow TFLite model: {str(e)}")
+    if SHADOW_YOLO_MODEL:
+        try:
+            candidate_yolo = YOLO(SHADOW_YOLO_MODEL)
+            candidates['yolo'] = lambda image: predict_yolo(image, model=candidate_yolo)
+            print(f"Shadow YOLO model loaded: {SHADOW_YOLO_MODEL}")
+        except Exception as e:
+            print(f"Error loading shadow YOLO model: {str(e)}")
+    return ShadowEvaluator(candidates) if candidates else None
+
+shadow_evaluator = load_shadow_evaluator()
+
+@app.route("/shadow/stats", methods=["GET"])
+def shadow_stats():
+    """Latency and agreement of the shadow candidates against the primary models."""
+    if shadow_evaluator is None:
+        return jsonify({'enabled': False})
+    summary = shadow_evaluator.summary()
+    summary['enabled'] = True
+    return jsonify(summary)
+
+# Frame identity sent by the client (sequence number and NAO capture time),
+# returned untouched so responses can be matched to frames for latency accounting
+FRAME_ECHO_FIELDS = ('frame_seq', 'frame_timestamp')
+
+def echo_frame_fields(data, response):
+    for field in FRAME_ECHO_FIELDS:
+        if field in data:
+            response[field] = data[field]
+
 @app.route("/predict/<model_type>", methods=["POST"])
 def predict_endpoint(model_type):
     """Endpoint that takes model type as part of the URL."""
@@ -115,6 +434,7 @@ def predict_endpoint(model_type):
     if model_type not in ['tflite', 'yolo', 'face', 'both']:
         return jsonify({'error': 'Invalid model type. Use tflite, yolo, face, or both'}), 400
     
+    request_start = time.perf_counter()
     try:
         data = request.json
         if not data or 'image' not in data:
@@ -125,50 +445,276 @@ def predict_endpoint(model_type):
         # Decode the base64 image
         #print("Decoding image...")
         image_bytes = base64.b64decode(image_base64)
-        image_np = np.frombuffer(image_bytes, dtype=np.uint8)
-        image = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            return jsonify({'error': 'Failed to decode image'}), 400
-            
-        #print(f"Image shape: {image.shape}")
-        
-        response = {}
+        # Only decode at full resolution if a model that needs it is part of this request
+        models = ['tflite', 'yolo', 'face'] if model_type == 'both' else [model_type]
+        frame = FrameView(image_bytes, scale=min(MODEL_DECODE_SCALE[m] for m in models))
+        try:
+            if not frame.images:
+                return jsonify({'error': 'Failed to decode image'}), 400
+            timings = {}
+            response = run_models(model_type, frame, timings)
+        finally:
+            frame.release()
+        if shadow_evaluator is not None:
+            shadow_evaluator.maybe_submit(image_bytes, response, timings)
+        # Lets clients separate server processing from network time
+        response['server_time_ms'] = (time.perf_counter() - request_start) * 1000.0
+        response['model_time_ms'] = timings
+        echo_frame_fields(data, response)
+        return jsonify(response)
         
-        # Run predictions based on requested model
-        if model_type in ['tflite', 'both']:
-            if interpreter is not None:
-                preprocessed_image = preprocess_image(image)
-                tflite_result = predict_tflite(preprocessed_image)
-                if tflite_result is not None:
-                    response['tflite_prediction'] = tflite_result.tolist()
-            else:
-                response['tflite_error'] = 'TFLite model not loaded'
+    except Exception as e:
+        print(f"Error in predict_endpoint: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def run_models(model_type, frame, timings=None):
+    """Run the requested models on a decoded FrameView and build the response.
+
+    Per-model latency in milliseconds is recorded into ``timings`` if given.
+    """
+    response = {}
+    if timings is None:
+        timings = {}
         
-        if model_type in ['yolo', 'both']:
-            if yolo_model is not None:
-                yolo_result = predict_yolo(image)
-                if yolo_result is not None:
-                    response['yolo_prediction'] = yolo_result
-            else:
-                response['yolo_error'] = 'YOLO model not loaded'
-                
-        if model_type in ['face', 'both']:
-            #print('Processing face detection...')
-            face_locations = detect_faces(image)
-            response['face_locations'] = face_locations
-                #response['face_locations'] = face_locations
+    # Run predictions based on requested model
+    if model_type in ['tflite', 'both']:
+        if interpreter is not None:
+            start = time.perf_counter()
+            tflite_result = predict_tflite(frame.get(1))
+            timings['tflite'] = (time.perf_counter() - start) * 1000.0
+            if tflite_result is not None:
+                response['tflite_prediction'] = tflite_result.tolist()
         else:
-            response['face_error'] = 'Face detection failed'
-                #response['face_locations'] = face_locations
-        
-        #print(f"Sending response: {response}")
+            response['tflite_error'] = 'TFLite model not loaded'
+    
+    if model_type in ['yolo', 'both']:
+        if yolo_model is not None:
+            start = time.perf_counter()
+            yolo_result = predict_yolo(frame.get(1))
+            timings['yolo'] = (time.perf_counter() - start) * 1000.0
+            if yolo_result is not None:
+                response['yolo_prediction'] = yolo_result
+        else:
+            response['yolo_error'] = 'YOLO model not loaded'
+            
+    if model_type in ['face', 'both']:
+        #print('Processing face detection...')
+        face_locations = detect_faces(frame)
+        response['face_locations'] = face_locations
+            #response['face_locations'] = face_locations
+    else:
+        response['face_error'] = 'Face detection failed'
+            #response['face_locations'] = face_locations
+    
+    #print(f"Sending response: {response}")
+    return response
+
+# Peekaboo session settings. The classifier score is treated like the robot's 'p' key
+# handler does: below the threshold means the face is covered.
+PEEKABOO_COVERED_BELOW = 0.4     # score must drop below this to enter 'covered'
+PEEKABOO_UNCOVERED_ABOVE = 0.6   # score must rise above this to enter 'uncovered'
+PEEKABOO_UNCERTAIN_MARGIN = 0.15 # scores this close to the thresholds escalate the rate
+PEEKABOO_DEBOUNCE_FRAMES = 2     # consecutive classifications needed to accept a transition
+PEEKABOO_IDLE_INTERVAL = 0.5     # seconds between classifications in a stable state
+PEEKABOO_ACTIVE_INTERVAL = 0.1   # seconds between classifications around a transition
+PEEKABOO_ESCALATE_HOLD = 1.0     # seconds to stay escalated after the last trigger
+PEEKABOO_SESSION_TIMEOUT = 60.0  # drop sessions that have not sent a frame for this long
+
+class PeekabooSession:
+    """Debounced covered/uncovered state machine for one peekaboo game.
+
+    Frames are only classified every ``interval`` seconds. The rate is
+    escalated while a transition looks likely: the score is near a
+    threshold, a transition is being debounced, or the client-reported face
+    presence just changed. Only state transitions are reported as events.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.state = 'unknown'
+        self.pending_state = None
+        self.pending_count = 0
+        self.last_score = None
+        self.face_present = None
+        self.last_classified = 0.0
+        self.escalated_until = 0.0
+        self.last_seen = time.time()
+        self.frames_received = 0
+        self.frames_classified = 0
+        self.events = deque(maxlen=20)
+        self.lock = threading.Lock()
+
+    def interval(self, now):
+        """Current time between classifications."""
+        if now < self.escalated_until:
+            return PEEKABOO_ACTIVE_INTERVAL
+        return PEEKABOO_IDLE_INTERVAL
+
+    def _escalate(self, now):
+        self.escalated_until = now + PEEKABOO_ESCALATE_HOLD
+
+    def should_classify(self, now, face_present=None):
+        """Register an incoming frame and decide whether it needs classifying."""
+        self.frames_received += 1
+        self.last_seen = now
+
+        if face_present is not None:
+            face_present = bool(face_present)
+            # A face appearing or disappearing is the usual precursor of a transition
+            if self.face_present is not None and face_present != self.face_present:
+                self._escalate(now)
+            self.face_present = face_present
+
+        if now - self.last_classified < self.interval(now):
+            return False
+        # Claim the slot now so concurrent frames of the same session are skipped
+        self.last_classified = now
+        return True
+
+    def update(self, score, now):
+        """Feed a classifier score; returns a transition event or None."""
+        self.frames_classified += 1
+        self.last_score = score
+
+        if PEEKABOO_COVERED_BELOW - PEEKABOO_UNCERTAIN_MARGIN <= score <= \
+                PEEKABOO_UNCOVERED_ABOVE + PEEKABOO_UNCERTAIN_MARGIN:
+            self._escalate(now)
+
+        if score < PEEKABOO_COVERED_BELOW:
+            observed = 'covered'
+        elif score > PEEKABOO_UNCOVERED_ABOVE:
+            observed = 'uncovered'
+        else:
+            observed = None  # Inside the hysteresis band, keep the current state
+
+        if observed is None or observed == self.state:
+            self.pending_state = None
+            self.pending_count = 0
+            return None
+
+        if observed == self.pending_state:
+            self.pending_count += 1
+        else:
+            self.pending_state = observed
+            self.pending_count = 1
+        self._escalate(now)
+
+        if self.pending_count < PEEKABOO_DEBOUNCE_FRAMES:
+            return None
+
+        event = {
+            'event': observed,
+            'previous': self.state,
+            'score': score,
+            'timestamp': now
+        }
+        self.state = observed
+        self.pending_state = None
+        self.pending_count = 0
+        self.events.append(event)
+        return event
+
+    def summary(self, now):
+        """Session state and counters for the client."""
+        return {
+            'session_id': self.session_id,
+            'state': self.state,
+            'score': self.last_score,
+            'face_present': self.face_present,
+            'next_interval': self.interval(now),
+            'frames_received': self.frames_received,
+            'frames_classified': self.frames_classified,
+            'recent_events': list(self.events)
+        }
+
+peekaboo_sessions = {}
+peekaboo_sessions_lock = threading.Lock()
+
+def get_peekaboo_session(session_id):
+    """Return the session for ``session_id``, creating it and pruning idle ones."""
+    now = time.time()
+    with peekaboo_sessions_lock:
+        for sid in [sid for sid, sess in peekaboo_sessions.items()
+                    if now - sess.last_seen > PEEKABOO_SESSION_TIMEOUT]:
+            del peekaboo_sessions[sid]
+        if session_id not in peekaboo_sessions:
+            peekaboo_sessions[session_id] = PeekabooSession(session_id)
+        return peekaboo_sessions[session_id]
+
+@app.route("/peekaboo/<session_id>", methods=["POST"])
+def peekaboo_frame(session_id):
+    """Feed a frame to a peekaboo session; only transitions are returned as events.
+
+    The JSON body carries the base64 ``image`` and optionally ``face_present``
+    from the client's own face tracking. Frames that fall between scheduled
+    classifications are not even decoded. ``next_interval`` tells the client
+    how long it can wait before the next frame is worth sending.
+    """
+    if interpreter is None:
+        return jsonify({'error': 'TFLite model not loaded'}), 503
+
+    request_start = time.perf_counter()
+    try:
+        data = request.json
+        if not data or 'image' not in data:
+            return jsonify({'error': 'No image data provided'}), 400
+
+        session = get_peekaboo_session(session_id)
+        with session.lock:
+            classify = session.should_classify(time.time(), data.get('face_present'))
+
+        response = {'classified': classify, 'events': []}
+        if classify:
+            frame = FrameView(base64.b64decode(data['image']), scale=MODEL_DECODE_SCALE['tflite'])
+            try:
+                if not frame.images:
+                    return jsonify({'error': 'Failed to decode image'}), 400
+                tflite_result = predict_tflite(frame.get(1))
+            finally:
+                frame.release()
+            if tflite_result is None:
+                return jsonify({'error': 'TFLite prediction failed'}), 500
+
+            with session.lock:
+                event = session.update(float(tflite_result[0][0]), time.time())
+            if event is not None:
+                response['events'].append(event)
+
+        with session.lock:
+            summary = session.summary(time.time())
+        response.update({
+            'state': summary['state'],
+            'score': summary['score'],
+            'next_interval': summary['next_interval'],
+            'server_time_ms': (time.perf_counter() - request_start) * 1000.0
+        })
+        echo_frame_fields(data, response)
         return jsonify(response)
-        
+
     except Exception as e:
-        print(f"Error in predict_endpoint: {str(e)}")
+        print(f"Error in peekaboo_frame: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route("/peekaboo/<session_id>", methods=["GET"])
+def peekaboo_status(session_id):
+    """Return the state and counters of a peekaboo session."""
+    with peekaboo_sessions_lock:
+        session = peekaboo_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with session.lock:
+        return jsonify(session.summary(time.time()))
+
+@app.route("/peekaboo/<session_id>", methods=["DELETE"])
+def peekaboo_end(session_id):
+    """End a peekaboo session."""
+    with peekaboo_sessions_lock:
+        session = peekaboo_sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with session.lock:
+        return jsonify(session.summary(time.time()))
+
 @app.route("/status", methods=["GET"])
 def status():
     """Check server status and available models."""
@@ -178,13 +724,15 @@ def status():
             'tflite': interpreter is not None,
             'yolo': yolo_model is not None,
             'face': True
-        }
+        },
+        'tflite_backend': TFLITE_BACKEND,
+        'shadow_models': sorted(shadow_evaluator.candidates) if shadow_evaluator is not None else []
     })
 
 if __name__ == "__main__":
     print("\nServer starting...")
     print("\nModel Status:")
-    print(f"- TFLite model: {'Loaded' if interpreter is not None else 'Not loaded'}")
+    print(f"- TFLite model: {'Loaded' if interpreter is not None else 'Not loaded'} (backend: {TFLITE_BACKEND})")
     print(f"- YOLO model: {'Loaded' if yolo_model is not None else 'Not loaded'}")
     print("- Face detection: Available")
     print("\nAvailable endpoints:")
@@ -192,6 +740,8 @@ if __name__ == "__main__":
     print("- POST /predict/yolo   : Use YOLO model")
     print("- POST /predict/face   : Use face detection")
     print("- POST /predict/both   : Use all models")
+    print("- POST /peekaboo/<id> : Feed a frame to a peekaboo session")
+    print("- GET  /shadow/stats  : Shadow model latency and agreement")
     print("- GET  /status        : Check server status")
     
     app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
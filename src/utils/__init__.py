@@ -1,2 +1,11 @@
 # utils/__init__.py
-from utils.image_utils import capture_frame, send_image_to_server, save_image, annotate_image, calculate_frame, load_class_names
\ No newline at end of file
+from utils.image_utils import capture_frame, send_image_to_server, send_peekaboo_frame, save_image, annotate_image, calculate_frame, load_class_names
+from utils.image_utils import InferenceClient, CircuitBreaker, get_inference_client, rescale_prediction
+from utils.rate_control import AdaptiveRateController
+from utils.local_detector import LocalFaceDetector
+from utils.frame_buffer import FrameRingBuffer, FrameCapture, Frame
+from utils.latency import LatencyTracker
+from utils.recording import SessionRecorder, SessionPlayer
+from utils.fake_naoqi import FakeSession
+from utils.motion_dispatcher import MotionDispatcher, clamp_head
+from utils.joint_state import JointStateCache
\ No newline at end of file
@@ -0,0 +1,407 @@
+# -*- coding: future_fstrings -*-
+# utils/fake_naoqi.py
+"""In-process stand-in for a NAOqi qi.Session, for running without a robot.
+
+Implements the subset of ALMotion, ALVideoDevice, ALBattery,
+ALTextToSpeech, ALRobotPosture and ALMemory that the clients call. Every
+call goes through a proxy that adds configurable RPC latency/jitter and
+counts calls per method, so control-loop rates and RPC budgets can be
+measured on a plain Linux box.
+
+The head follows a simple kinematics model: setAngles/changeAngles set a
+target that the joints approach at fractionMaxSpeed of NAO's maximum joint
+speed, clamped to the joint limits. The synthetic camera draws a face at
+the image position of a world target seen from the current head pose, so
+head tracking closes the loop. A SessionPlayer (utils/recording.py) can
+replace the synthetic camera to replay a recorded stream.
+
+Like utils/recording.py this only depends on numpy, so better_gui can load it.
+"""
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+
+# NAO top camera field of view and head joint limits/speeds (radians, rad/s)
+CAMERA_HFOV = math.radians(60.97)
+CAMERA_VFOV = math.radians(47.64)
+JOINT_LIMITS = {'HeadYaw': (-2.0857, 2.0857), 'HeadPitch': (-0.6720, 0.5149)}
+JOINT_MAX_SPEED = {'HeadYaw': 8.26, 'HeadPitch': 7.19}
+RESOLUTION_SIZES = {0: (160, 120), 1: (320, 240), 2: (640, 480), 3: (1280, 960)}
+
+
+class FakeFuture(object):
+    """Minimal qi.Future for calls made with _async=True."""
+
+    def __init__(self, function, args, kwargs):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+        thread = threading.Thread(target=self._run, args=(function, args, kwargs))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, function, args, kwargs):
+        try:
+            self._value = function(*args, **kwargs)
+        except Exception as e:
+            self._error = e
+        self._done.set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def isFinished(self):
+        return self._done.is_set()
+
+    def hasError(self):
+        return self._error is not None
+
+    def value(self, timeout=None):
+        self.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class _ServiceProxy(object):
+    """Adds RPC latency and per-method call counting in front of a fake service."""
+
+    def __init__(self, name, service, session):
+        self._name = name
+        self._service = service
+        self._session = session
+
+    def __getattr__(self, method):
+        target = getattr(self._service, method)
+        if not callable(target):
+            return target
+
+        def call(*args, **kwargs):
+            run_async = kwargs.pop('_async', False)
+            self._session._count(f"{self._name}.{method}")
+
+            def delayed(*a, **k):
+                self._session._delay()
+                return target(*a, **k)
+            if run_async:
+                return FakeFuture(delayed, args, kwargs)
+            return delayed(*args, **kwargs)
+        return call
+
+
+class FakeMotion(object):
+    """ALMotion subset with a first-order head and body model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._angles = {'HeadYaw': 0.0, 'HeadPitch': 0.0}
+        self._targets = dict(self._angles)
+        self._speeds = {'HeadYaw': 0.0, 'HeadPitch': 0.0}
+        self._velocity = (0.0, 0.0, 0.0)
+        self._position = [0.0, 0.0, 0.0]
+        self._updated = time.time()
+        self.awake = False
+
+    def _step(self):
+        # Integrate joints and body from the last update to now
+        now = time.time()
+        dt = now - self._updated
+        self._updated = now
+        for joint, target in self._targets.items():
+            error = target - self._angles[joint]
+            max_step = self._speeds[joint] * dt
+            self._angles[joint] += max(-max_step, min(max_step, error))
+        x, y, theta = self._velocity
+        heading = self._position[2]
+        self._position[0] += (x * math.cos(heading) - y * math.sin(heading)) * dt
+        self._position[1] += (x * math.sin(heading) + y * math.cos(heading)) * dt
+        self._position[2] += theta * dt
+
+    @staticmethod
+    def _names(names):
+        return [names] if isinstance(names, (str, type(u''))) else list(names)
+
+    def _set_targets(self, names, angles, fraction, relative):
+        names = self._names(names)
+        if not isinstance(angles, (list, tuple)):
+            angles = [angles] * len(names)
+        fraction = max(0.0, min(1.0, fraction))
+        with self._lock:
+            self._step()
+            for joint, angle in zip(names, angles):
+                if joint not in self._angles:
+                    continue
+                low, high = JOINT_LIMITS[joint]
+                base = self._angles[joint] if relative else 0.0
+                self._targets[joint] = max(low, min(high, base + angle))
+                self._speeds[joint] = fraction * JOINT_MAX_SPEED[joint]
+
+    def setAngles(self, names, angles, fractionMaxSpeed):
+        self._set_targets(names, angles, fractionMaxSpeed, relative=False)
+
+    def changeAngles(self, names, changes, fractionMaxSpeed):
+        self._set_targets(names, changes, fractionMaxSpeed, relative=True)
+
+    def getAngles(self, names, useSensors):
+        with self._lock:
+            self._step()
+            source = self._angles if useSensors else self._targets
+            return [source.get(joint, 0.0) for joint in self._names(names)]
+
+    def moveToward(self, x, y, theta):
+        # Normalised velocities scaled to roughly NAO's walking limits (m/s, rad/s)
+        with self._lock:
+            self._step()
+            self._velocity = (x * 0.1, y * 0.1, theta * 0.5)
+
+    def stopMove(self):
+        with self._lock:
+            self._step()
+            self._velocity = (0.0, 0.0, 0.0)
+
+    def getRobotPosition(self, useSensors):
+        with self._lock:
+            self._step()
+            return list(self._position)
+
+    def wakeUp(self):
+        self.awake = True
+
+    def rest(self):
+        self.stopMove()
+        self.awake = False
+
+    def setStiffnesses(self, names, stiffnesses):
+        pass
+
+
+class FakePosture(object):
+    def __init__(self, motion):
+        self.motion = motion
+        self.posture = 'Crouch'
+
+    def goToPosture(self, name, speed):
+        self.motion.wakeUp()
+        self.posture = name
+        return True
+
+    def getPosture(self):
+        return self.posture
+
+
+class FakeBattery(object):
+    def __init__(self, charge=80):
+        self.charge = charge
+
+    def getBatteryCharge(self):
+        return self.charge
+
+
+class FakeTextToSpeech(object):
+    def __init__(self):
+        self.parameters = {}
+        self.spoken = []
+
+    def say(self, text):
+        self.spoken.append(text)
+        print(f"[fake TTS] {text}")
+
+    def setParameter(self, name, value):
+        self.parameters[name] = value
+
+
+class FakeMemory(object):
+    """ALMemory subset; head joint sensor keys read from the motion model."""
+
+    SENSOR_KEY = "Device/SubDeviceList/{}/Position/Sensor/Value"
+
+    def __init__(self, motion):
+        self.motion = motion
+        self.data = {}
+
+    def getData(self, key):
+        for joint in JOINT_LIMITS:
+            if key == self.SENSOR_KEY.format(joint):
+                return self.motion.getAngles([joint], True)[0]
+        return self.data.get(key)
+
+    def getListData(self, keys):
+        return [self.getData(key) for key in keys]
+
+    def insertData(self, key, value):
+        self.data[key] = value
+
+
+class SyntheticCamera(object):
+    """ALVideoDevice subset rendering a face at a target seen from the current head pose.
+
+    The target sits at world yaw/pitch angles (radians) and, with
+    ``target_motion`` > 0, sweeps sinusoidally by that amplitude so tracking
+    has something to follow. target_box() gives the ground-truth face box
+    in image pixels as (top, right, bottom, left).
+
+    The default drawing is a cartoon face, fine for ground-truth tests but
+    not for the real detectors; pass ``face_image`` (an RGB array, e.g. a
+    cropped photo) to paste a real face instead.
+    """
+
+    def __init__(self, motion, target_yaw=0.3, target_pitch=0.1, target_motion=0.0,
+                 target_period=8.0, face_size=0.25, face_image=None):
+        self.motion = motion
+        self.target_yaw = target_yaw
+        self.target_pitch = target_pitch
+        self.target_motion = target_motion
+        self.target_period = target_period
+        self.face_size = face_size  # Face height as a fraction of the vertical FOV
+        self.face_image = face_image
+        self._clients = {}
+        self._started = time.time()
+
+    def target_angles(self, now=None):
+        now = time.time() if now is None else now
+        phase = 2.0 * math.pi * (now - self._started) / self.target_period
+        return (self.target_yaw + self.target_motion * math.sin(phase),
+                self.target_pitch + 0.5 * self.target_motion * math.sin(2.0 * phase))
+
+    def target_box(self, width, height, now=None):
+        yaw, pitch = self.motion.getAngles(['HeadYaw', 'HeadPitch'], True)
+        target_yaw, target_pitch = self.target_angles(now)
+        # Positive yaw is to the robot's left, i.e. towards smaller x in the image
+        cx = width / 2.0 - (target_yaw - yaw) / CAMERA_HFOV * width
+        cy = height / 2.0 + (target_pitch - pitch) / CAMERA_VFOV * height
+        half = self.face_size * height / 2.0
+        return (int(cy - half), int(cx + half * 0.8), int(cy + half), int(cx - half * 0.8))
+
+    def render(self, width, height, now=None):
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = (90, 110, 130)
+        top, right, bottom, left = self.target_box(width, height, now)
+        box_h, box_w = bottom - top, right - left
+        if box_h <= 0 or box_w <= 0:
+            return image
+        if self.face_image is not None:
+            # Nearest-neighbour resize of the face photo into the target box
+            rows = (np.arange(box_h) * self.face_image.shape[0] // box_h)
+            cols = (np.arange(box_w) * self.face_image.shape[1] // box_w)
+            face = self.face_image[rows][:, cols]
+            self._paint(image, top, left, np.ones((box_h, box_w), dtype=bool), face)
+            return image
+        # Skin-coloured ellipse with darker eyes and mouth
+        ys, xs = np.ogrid[top:bottom, left:right]
+        cy, cx = (top + bottom) / 2.0, (left + right) / 2.0
+        inside = ((ys - cy) / (box_h / 2.0)) ** 2 + ((xs - cx) / (box_w / 2.0)) ** 2 <= 1.0
+        self._paint(image, top, left, inside, (224, 172, 140))
+        for ex in (left + box_w * 0.3, left + box_w * 0.7):
+            self._fill(image, int(top + box_h * 0.35), int(ex - box_w * 0.08),
+                       int(top + box_h * 0.45), int(ex + box_w * 0.08), (40, 30, 30))
+        self._fill(image, int(top + box_h * 0.68), int(left + box_w * 0.3),
+                   int(top + box_h * 0.75), int(left + box_w * 0.7), (120, 40, 40))
+        return image
+
+    @staticmethod
+    def _fill(image, top, left, bottom, right, color):
+        height, width = image.shape[:2]
+        image[max(top, 0):min(bottom, height), max(left, 0):min(right, width)] = color
+
+    @staticmethod
+    def _paint(image, top, left, mask, color):
+        height, width = image.shape[:2]
+        y0, x0 = max(top, 0), max(left, 0)
+        y1, x1 = min(top + mask.shape[0], height), min(left + mask.shape[1], width)
+        if y1 <= y0 or x1 <= x0:
+            return
+        region = image[y0:y1, x0:x1]
+        visible = mask[y0 - top:y1 - top, x0 - left:x1 - left]
+        if isinstance(color, np.ndarray):
+            color = color[y0 - top:y1 - top, x0 - left:x1 - left][visible]
+        region[visible] = color
+
+    def subscribe(self, name, resolution, color_space, fps):
+        self._clients[name] = RESOLUTION_SIZES.get(resolution, RESOLUTION_SIZES[1])
+        return name
+
+    def unsubscribe(self, name):
+        self._clients.pop(name, None)
+
+    def setActiveCamera(self, camera_id):
+        return True
+
+    def setParameter(self, name, parameter, value):
+        return True
+
+    def releaseImage(self, name):
+        return True
+
+    def getImageRemote(self, name):
+        size = self._clients.get(name)
+        if size is None:
+            return None
+        now = time.time()
+        seconds = int(now)
+        width, height = size
+        return [width, height, 3, 11, seconds, int((now - seconds) * 1e6),
+                self.render(width, height, now).tobytes()]
+
+
+class FakeSession(object):
+    """qi.Session stand-in serving the fake services.
+
+    ``latency`` and ``jitter`` (seconds) are added to every call. ``camera``
+    replaces the synthetic camera, e.g. with a SessionPlayer.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, camera=None, battery=80, seed=None, **camera_options):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._counts = defaultdict(int)
+        self._counts_lock = threading.Lock()
+        self.started = time.time()
+
+        self.motion = FakeMotion()
+        self.camera = camera if camera is not None else SyntheticCamera(self.motion, **camera_options)
+        self._services = {
+            'ALMotion': self.motion,
+            'ALVideoDevice': self.camera,
+            'ALBattery': FakeBattery(battery),
+            'ALTextToSpeech': FakeTextToSpeech(),
+            'ALRobotPosture': FakePosture(self.motion),
+            'ALMemory': FakeMemory(self.motion),
+        }
+
+    def connect(self, url):
+        print(f"Fake NAOqi session (ignoring {url})")
+
+    def isConnected(self):
+        return True
+
+    def service(self, name):
+        if name not in self._services:
+            raise RuntimeError(f"Fake NAOqi session has no service {name}")
+        return _ServiceProxy(name, self._services[name], self)
+
+    def close(self):
+        pass
+
+    def _delay(self):
+        delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _count(self, method):
+        with self._counts_lock:
+            self._counts[method] += 1
+
+    def rpc_counts(self):
+        """Calls per 'Service.method' since the session was created."""
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def rpc_rates(self):
+        """Calls per second per 'Service.method' since the session was created."""
+        elapsed = max(time.time() - self.started, 1e-6)
+        return dict((method, count / elapsed) for method, count in self.rpc_counts().items())
@@ -0,0 +1,150 @@
+# -*- coding: future_fstrings -*-
+# utils/frame_buffer.py
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from config import FRAME_BUFFER_SIZE, VIDEO_FPS
+
+# timestamp is NAO's capture time in seconds (getImageRemote fields 4 and 5),
+# received is the client's time.time() when the frame was stored
+Frame = namedtuple('Frame', ['seq', 'timestamp', 'received', 'image'])
+
+class FrameRingBuffer(object):
+    """Fixed-size ring of preallocated frames shared by all camera consumers.
+
+    A single writer copies each camera image into the next slot and tags it
+    with an increasing sequence number. Readers get read-only views into the
+    ring, no copies, so display, inference and dataset capture all see the
+    exact same frame. A view stays valid for ``capacity`` further writes;
+    consumers that keep a frame longer than that must copy it.
+    """
+
+    def __init__(self, capacity=FRAME_BUFFER_SIZE):
+        self.capacity = capacity
+        self._data = None
+        self._seqs = [0] * capacity
+        self._timestamps = [0.0] * capacity
+        self._received = [0.0] * capacity
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _allocate(self, shape):
+        self._data = np.empty((self.capacity,) + shape, dtype=np.uint8)
+        self._seqs = [0] * self.capacity
+
+    def write(self, image_data, width, height, timestamp):
+        """Copy one RGB frame into the next slot. Returns its sequence number."""
+        received = time.time()
+        shape = (height, width, 3)
+        pixels = np.frombuffer(image_data, dtype=np.uint8).reshape(shape)
+        with self._cond:
+            # (Re)allocate on the first frame or when the resolution changes
+            if self._data is None or self._data.shape[1:] != shape:
+                self._allocate(shape)
+            slot = (self._seq + 1) % self.capacity
+            # Invalidate the slot before overwriting it so get() never returns a torn frame
+            self._seqs[slot] = 0
+        np.copyto(self._data[slot], pixels)
+        with self._cond:
+            self._seq += 1
+            self._seqs[slot] = self._seq
+            self._timestamps[slot] = timestamp
+            self._received[slot] = received
+            self._cond.notify_all()
+            return self._seq
+
+    def write_remote(self, image):
+        """Store a getImageRemote() result. Returns its sequence number, or None if invalid."""
+        if image is None or len(image) < 7:
+            return None
+        return self.write(image[6], image[0], image[1], image[4] + image[5] * 1e-6)
+
+    def _frame(self, slot):
+        view = self._data[slot]
+        view.flags.writeable = False
+        return Frame(self._seqs[slot], self._timestamps[slot], self._received[slot], view)
+
+    def latest(self, after_seq=0, timeout=None):
+        """Wait for a frame newer than ``after_seq`` and return the newest one.
+
+        Returns None on timeout or once the buffer is closed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._seq <= after_seq and not self._closed:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._seq <= after_seq:
+                return None
+            return self._frame(self._seq % self.capacity)
+
+    def get(self, seq):
+        """Return frame ``seq`` if it is still in the ring, else None."""
+        with self._cond:
+            if seq <= 0 or self._data is None:
+                return None
+            slot = seq % self.capacity
+            if self._seqs[slot] != seq:
+                return None
+            return self._frame(slot)
+
+    @property
+    def seq(self):
+        """Sequence number of the newest frame (0 before the first one)."""
+        return self._seq
+
+    def close(self):
+        """Wake up waiting readers; further latest() calls return immediately."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FrameCapture(object):
+    """Background thread that pulls camera frames from NAO into a FrameRingBuffer.
+
+    This is the only place getImageRemote() is called on the robot client;
+    everything else reads from the buffer.
+    """
+
+    def __init__(self, video_service, video_client, frames, fps=VIDEO_FPS):
+        self.video_service = video_service
+        self.video_client = video_client
+        self.frames = frames
+        self.fps = fps
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def _run(self):
+        frame_interval = 1.0 / self.fps
+        while self.running:
+            started = time.time()
+            try:
+                image = self.video_service.getImageRemote(self.video_client)
+                if self.frames.write_remote(image) is None:
+                    print("Invalid image data received")
+                    time.sleep(0.1)
+                    continue
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                time.sleep(0.1)
+                continue
+            time.sleep(max(0.0, frame_interval - (time.time() - started)))
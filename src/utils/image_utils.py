@@ -4,9 +4,17 @@ import cv2
 import numpy as np
 import base64
 import requests
+import requests.adapters
 import os
 import time
-from config import PREDICTION_SERVER_URL, COVERED_DIR, UNCOVERED_DIR
+import threading
+import Queue
+from config import PREDICTION_SERVER_URL, PEEKABOO_SERVER_URL, COVERED_DIR, UNCOVERED_DIR
+from config import INFERENCE_TIMEOUT, INFERENCE_CONNECT_TIMEOUT, INFERENCE_MAX_IN_FLIGHT
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_BACKOFF_INITIAL, BREAKER_BACKOFF_MAX
+from config import LOCAL_FALLBACK_ENABLED
+from utils.rate_control import AdaptiveRateController
+from utils.local_detector import load_local_detector
 
 def capture_frame(video_service, video_client):
     """Capture a frame from NAO's video service with error handling."""
@@ -35,32 +43,373 @@ def capture_frame(video_service, video_client):
         print("Error capturing frame: {}".format(e))
         return None
 
-def send_image_to_server(image, mode):
-    """Send captured image to the flask server and receive a prediction."""
-    try:
-        _, image_encoded = cv2.imencode('.jpg', image)
-        image_base64 = base64.b64encode(image_encoded.tostring())  # Use tostring() for Python 2.7
-        
-        url = f"{PREDICTION_SERVER_URL}/{mode}"
-        
-        response = requests.post(
-            url,  
-            json={"image": image_base64}
-        )
-        
+class CircuitBreaker(object):
+    """Stops calls to a failing server and probes it again after an exponential backoff.
+
+    closed: requests flow normally. open: requests are rejected until the
+    backoff expires. half_open: a single probe request is let through; its
+    outcome closes or re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    PROBE = 'probe'  # allow() result for the half-open probe; truthy like True
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 backoff_initial=BREAKER_BACKOFF_INITIAL, backoff_max=BREAKER_BACKOFF_MAX):
+        self.failure_threshold = failure_threshold
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = backoff_initial
+        self.retry_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a request may be sent now, PROBE if it is the half-open probe, else False."""
+        with self._lock:
+            if self.state == self.OPEN and time.time() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return self.PROBE
+            return False
+
+    def release(self, permit):
+        """Give back a half-open probe that ended without reaching the server.
+
+        ``permit`` is what allow() returned. Callers must pass it back once
+        the request is over (deadline passed, encoding failed, or done), or
+        the breaker would wait forever for a probe that is not coming. Only
+        the probe itself is released; ordinary requests finishing while the
+        breaker is half-open leave the probe in flight.
+        """
+        if permit != self.PROBE:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("Inference server reachable again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.backoff = self.backoff_initial
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    print(f"Inference server failing, backing off for {self.backoff:.1f}s")
+                self.state = self.OPEN
+                self.retry_at = time.time() + self.backoff
+                self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
+
+
+class InferenceClient(object):
+    """Keep-alive HTTP client for the inference server.
+
+    Requests reuse pooled connections, carry a deadline, and go through a
+    circuit breaker. An optional AdaptiveRateController picks the JPEG
+    quality and downscale per request from measured round-trip times; boxes
+    in responses are mapped back to full-frame coordinates.
+    If a ``fallback`` detector is given, face requests are answered locally
+    while the breaker is open or when a request fails; those results carry
+    'source': 'local'. The breaker's half-open probes switch back to the
+    server as soon as it answers again.
+    predict() is a blocking call bounded by the deadline;
+    submit()/collect() keep up to ``max_in_flight`` requests running on
+    worker threads and hand results back in submission order.
+    """
+
+    def __init__(self, predict_url=PREDICTION_SERVER_URL, peekaboo_url=PEEKABOO_SERVER_URL,
+                 timeout=INFERENCE_TIMEOUT, connect_timeout=INFERENCE_CONNECT_TIMEOUT,
+                 max_in_flight=INFERENCE_MAX_IN_FLIGHT, breaker=None, rate_controller=None,
+                 fallback=None):
+        self.predict_url = predict_url
+        self.peekaboo_url = peekaboo_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_in_flight = max_in_flight
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_controller = rate_controller
+        self.fallback = fallback
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # In-flight window state
+        self._lock = threading.Lock()
+        self._requests = Queue.Queue()
+        self._workers = []
+        self._in_flight = 0
+        self._next_seq = 0
+        self._next_out = 0
+        self._done = {}
+
+    @staticmethod
+    def encode(image, quality=None, scale=1.0):
+        """JPEG-encode and base64 an image for the server, optionally downscaled first."""
+        if scale != 1.0:
+            image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)] if quality else []
+        _, image_encoded = cv2.imencode('.jpg', image, params)
+        return base64.b64encode(image_encoded.tostring())  # Use tostring() for Python 2.7
+
+    def _operating_point(self):
+        """JPEG quality and downscale to encode with (defaults without a rate controller)."""
+        if self.rate_controller is None:
+            return None, 1.0
+        return self.rate_controller.quality, self.rate_controller.scale
+
+    @property
+    def send_interval(self):
+        """Minimum seconds between frames suggested by the rate controller."""
+        if self.rate_controller is None:
+            return 0.0
+        return self.rate_controller.send_interval
+
+    @property
+    def using_fallback(self):
+        """True while face requests are being answered by the local detector."""
+        return self.fallback is not None and self.breaker.is_open
+
+    def _fallback(self, image, mode):
+        """Answer a request locally if the fallback detector covers ``mode``."""
+        if self.fallback is None or mode != 'face':
+            return None
+        try:
+            return self.fallback.detect(image)
+        except Exception as e:
+            print("Error in local face detector: {}".format(e))
+            return None
+
+    def _post(self, url, payload, deadline):
+        """POST within the deadline, updating the circuit breaker. Returns JSON or None."""
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        sent = time.time()
+        try:
+            response = self.session.post(
+                url,
+                json=payload,
+                timeout=(min(self.connect_timeout, remaining), remaining)
+            )
+            received = time.time()
+            result = response.json() if response.status_code == 200 else None
+        except requests.exceptions.Timeout:
+            self.breaker.record_failure()
+            if self.rate_controller is not None:
+                self.rate_controller.observe_timeout(remaining * 1000.0)
+            return None
+        except requests.exceptions.ConnectionError:
+            if not self.breaker.is_open:
+                print("Connection failed. Is the server running?")
+            self.breaker.record_failure()
+            return None
+        except ValueError as e:
+            print("Invalid response from server: {}".format(e))
+            self.breaker.record_failure()
+            return None
+        except Exception as e:
+            print("Error sending image to server: {}".format(e))
+            self.breaker.record_failure()
+            return None
+
         if response.status_code == 200:
-            return response.json()
+            self.breaker.record_success()
+            result['client_timing'] = {'sent': sent, 'response': received}
+            if self.rate_controller is not None:
+                self.rate_controller.observe((received - sent) * 1000.0, result.get('server_time_ms'))
+            return result
+
+        print("Server error: {}".format(response.status_code))
+        if response.status_code >= 500:
+            self.breaker.record_failure()
         else:
-            print("Server error: {}".format(response.status_code))
-            return None
-            
-    except requests.exceptions.ConnectionError:
-        print("Connection failed. Is the server running?")
-        return None
-    except Exception as e:
-        print("Error sending image to server: {}".format(e))
+            self.breaker.record_success()
         return None
 
+    def predict(self, image, mode, timeout=None, frame_info=None):
+        """Blocking prediction; returns the server's JSON or None on failure/deadline."""
+        permit = self.breaker.allow()
+        if not permit:
+            return self._fallback(image, mode)
+        deadline = time.time() + (timeout or self.timeout)
+        try:
+            result = self._predict(image, mode, deadline, frame_info)
+        finally:
+            self.breaker.release(permit)
+        if result is None:
+            result = self._fallback(image, mode)
+        return result
+
+    def _predict(self, image, mode, deadline, frame_info=None):
+        """Encode at the current operating point, POST, and map boxes back to full size.
+
+        ``frame_info`` (e.g. frame_seq/frame_timestamp) is sent along and
+        echoed back by the server. The result gains 'client_timing' with
+        the encode, send and response times.
+        """
+        quality, scale = self._operating_point()
+        encode_start = time.time()
+        try:
+            payload = {"image": self.encode(image, quality, scale)}
+        except Exception as e:
+            print("Error encoding image: {}".format(e))
+            return None
+        if frame_info:
+            payload.update(frame_info)
+        result = self._post(f"{self.predict_url}/{mode}", payload, deadline)
+        if result:
+            result['client_timing']['encode'] = encode_start
+            if scale != 1.0:
+                rescale_prediction(result, 1.0 / scale)
+        return result
+
+    def peekaboo(self, image, session_id, face_present=None, timeout=None):
+        """Send a frame to a server-side peekaboo session."""
+        permit = self.breaker.allow()
+        if not permit:
+            return None
+        deadline = time.time() + (timeout or self.timeout)
+        try:
+            quality, scale = self._operating_point()
+            try:
+                payload = {"image": self.encode(image, quality, scale)}
+            except Exception as e:
+                print("Error encoding image: {}".format(e))
+                return None
+            if face_present is not None:
+                payload["face_present"] = face_present
+            return self._post(f"{self.peekaboo_url}/{session_id}", payload, deadline)
+        finally:
+            self.breaker.release(permit)
+
+    def submit(self, image, mode, context=None, timeout=None, frame_info=None):
+        """Queue a prediction without blocking.
+
+        Returns a sequence number, or None if the in-flight window is full or
+        the breaker is open and no fallback covers ``mode``. ``image`` must not be modified until its result
+        is collected. ``context`` is returned alongside the result.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                return None
+            remote = self.breaker.allow()
+            if not remote and (self.fallback is None or mode != 'face'):
+                return None
+            if not self._workers:
+                self._start_workers()
+            seq = self._next_seq
+            self._next_seq += 1
+            self._in_flight += 1
+        deadline = time.time() + (timeout or self.timeout)
+        self._requests.put((seq, image, mode, context, deadline, remote, frame_info))
+        return seq
+
+    def collect(self):
+        """Return finished submissions as (seq, context, result), in submission order."""
+        ready = []
+        with self._lock:
+            while self._next_out in self._done:
+                context, result = self._done.pop(self._next_out)
+                ready.append((self._next_out, context, result))
+                self._next_out += 1
+        return ready
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def _start_workers(self):
+        for _ in range(self.max_in_flight):
+            worker = threading.Thread(target=self._worker_loop)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            seq, image, mode, context, deadline, remote, frame_info = item
+            result = None
+            try:
+                # Requests that waited past their deadline are dropped unsent
+                if remote and time.time() < deadline:
+                    result = self._predict(image, mode, deadline, frame_info)
+                if result is None:
+                    result = self._fallback(image, mode)
+            except Exception as e:
+                print("Error in inference worker: {}".format(e))
+            finally:
+                self.breaker.release(remote)
+            with self._lock:
+                self._done[seq] = (context, result)
+                self._in_flight -= 1
+
+    def close(self):
+        """Stop the worker threads and close pooled connections."""
+        for _ in self._workers:
+            self._requests.put(None)
+        self._workers = []
+        self.session.close()
+
+
+def rescale_prediction(prediction, factor):
+    """Scale face and YOLO box coordinates in a server response by ``factor`` (in place)."""
+    if prediction.get('face_locations'):
+        prediction['face_locations'] = [
+            [int(round(v * factor)) for v in box] for box in prediction['face_locations']
+        ]
+    for result in prediction.get('yolo_prediction') or []:
+        result['bounding_box'] = [int(round(v * factor)) for v in result['bounding_box']]
+    return prediction
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_inference_client():
+    """Return the process-wide InferenceClient shared by the GUI and robot controller."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            fallback = load_local_detector() if LOCAL_FALLBACK_ENABLED else None
+            _shared_client = InferenceClient(rate_controller=AdaptiveRateController(),
+                                             fallback=fallback)
+        return _shared_client
+
+def send_image_to_server(image, mode):
+    """Send captured image to the flask server and receive a prediction."""
+    return get_inference_client().predict(image, mode)
+
+def send_peekaboo_frame(image, session_id, face_present=None):
+    """Send a frame to a server-side peekaboo session.
+
+    The server only classifies some frames and returns covered/uncovered
+    transitions in 'events', plus 'next_interval' (seconds) until the next
+    frame is worth sending.
+    """
+    return get_inference_client().peekaboo(image, session_id, face_present)
+
 def save_image(image, directory=None, prefix="image"):
     """Save an image to the specified directory with timestamp."""
     # Use configured directories if none provided
@@ -118,9 +467,13 @@ def annotate_image(image, server_results, mode, class_names, center_frame_dim):
                     print("Error processing YOLO result: {}".format(e))
                     continue
                     
+        elif mode == 'tflite' and 'peekaboo_state' in server_results:
+            cv2.putText(image, "Peekaboo: {}".format(server_results['peekaboo_state']), (10, 20),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
         elif mode == 'face':
             try:
-                face_locations = server_results['face_locations']
+                face_locations = server_results.get('face_locations')
                 
                 if not face_locations:
                     return image, top_l, bottom_r
@@ -0,0 +1,174 @@
+# -*- coding: future_fstrings -*-
+# utils/joint_state.py
+"""Locally cached head joint angles, refreshed by a background sampler.
+
+Control code reads the cache instead of making a blocking getAngles round
+trip before every setAngles. Each reading carries its sample time, so
+callers can check age/freshness and fall back to a direct read when the
+cache is too old. A ring buffer of recent timestamped readings lets
+callers interpolate the pose at an earlier time, e.g. when a camera frame
+was captured.
+
+Self-contained (no config import) so better_gui can load it as well.
+"""
+import threading
+import time
+import numpy as np
+
+HEAD_JOINTS = ["HeadYaw", "HeadPitch"]
+SENSOR_KEY = "Device/SubDeviceList/{}/Position/Sensor/Value"
+
+
+class JointStateCache(object):
+    """Head joint angles sampled every ``interval`` seconds while they are in use.
+
+    Samples come from one batched ALMemory getListData of the joint sensor
+    keys when a memory service is given, otherwise from ALMotion.getAngles.
+    getAngles() mirrors the ALMotion call, so the cache can stand in for the
+    motion service wherever only angles are read; it re-reads the robot
+    when the cache is older than ``max_age``. The sampler only polls while
+    read() or at() has been called in the last ``idle_after`` seconds, so an
+    idle robot costs no joint RPCs.
+    """
+
+    def __init__(self, motion_service=None, memory_service=None, joints=HEAD_JOINTS,
+                 interval=0.02, max_age=0.1, history_size=256, idle_after=1.0):
+        self.motion_service = motion_service
+        self.memory_service = memory_service
+        self.joints = list(joints)
+        self.interval = interval
+        self.max_age = max_age
+        self.idle_after = idle_after
+        self._keys = [SENSOR_KEY.format(joint) for joint in self.joints]
+        self._lock = threading.Lock()
+        self._angles = None
+        self._timestamp = 0.0
+        self.samples = 0
+        self._demand = 0.0  # time.time() of the last read()/at()
+        self._wanted = threading.Event()
+        
+        # History ring buffer: one row per reading, oldest overwritten first
+        self._history_times = np.zeros(history_size)
+        self._history_angles = np.zeros((history_size, len(self.joints)))
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wanted.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def _mark_demand(self):
+        self._demand = time.time()
+        self._wanted.set()
+
+    def _run(self):
+        while self.running:
+            if time.time() - self._demand > self.idle_after:
+                # Nobody has read the joints lately: stop polling until someone does
+                self._wanted.wait(0.5)
+                self._wanted.clear()
+                continue
+            started = time.time()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling joint state: {e}")
+                time.sleep(0.1)
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def sample(self):
+        """Read the joints from the robot now and update the cache. Returns the angles."""
+        requested = time.time()
+        if self.memory_service is not None:
+            angles = self.memory_service.getListData(self._keys)
+        else:
+            angles = self.motion_service.getAngles(self.joints, True)
+        # Midpoint of the round trip is the best estimate of when the sensors were read
+        self.update(angles, (requested + time.time()) / 2.0)
+        return list(angles)
+
+    def update(self, angles, timestamp=None):
+        """Store a reading taken at ``timestamp`` (defaults to now).
+
+        read() can sample from another thread while the sampler does, so a
+        reading may arrive after a newer one; it is dropped to keep the
+        history in time order for at().
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self.samples and timestamp <= self._timestamp:
+                return
+            self._angles = [float(angle) for angle in angles]
+            self._timestamp = timestamp
+            slot = self.samples % len(self._history_times)
+            self._history_times[slot] = self._timestamp
+            self._history_angles[slot] = self._angles
+            self.samples += 1
+
+    @property
+    def angles(self):
+        """Latest cached angles in joint order, or None before the first sample."""
+        with self._lock:
+            return list(self._angles) if self._angles is not None else None
+
+    @property
+    def timestamp(self):
+        """time.time() at which the cached angles were read."""
+        return self._timestamp
+
+    @property
+    def age(self):
+        """Seconds since the cached angles were read (infinite before the first sample)."""
+        if self._angles is None:
+            return float('inf')
+        return time.time() - self._timestamp
+
+    def is_fresh(self, max_age):
+        """True if the cached angles are at most ``max_age`` seconds old."""
+        return self.age <= max_age
+
+    def read(self, max_age):
+        """Cached angles if younger than ``max_age`` seconds, otherwise a direct read."""
+        self._mark_demand()
+        angles = self.angles
+        if angles is not None and self.is_fresh(max_age):
+            return angles
+        return self.sample()
+
+    def history(self):
+        """Buffered (times, angles) arrays, oldest first."""
+        with self._lock:
+            count = min(self.samples, len(self._history_times))
+            start = self.samples - count
+            order = np.arange(start, self.samples) % len(self._history_times)
+            return self._history_times[order], self._history_angles[order]
+
+    def at(self, timestamp, tolerance=0.05):
+        """Angles interpolated at ``timestamp`` (time.time() clock).
+
+        Returns None if the buffer does not cover the time (older than the
+        oldest reading, or newer than the latest by more than ``tolerance``).
+        """
+        self._mark_demand()
+        times, angles = self.history()
+        if not len(times) or timestamp < times[0] or timestamp > times[-1] + tolerance:
+            return None
+        return [float(np.interp(timestamp, times, angles[:, j])) for j in range(angles.shape[1])]
+
+    def getAngles(self, names, useSensors=True):
+        """ALMotion-style read of the cached angles for the requested joints."""
+        angles = self.read(self.max_age)
+        if isinstance(names, (str, type(u''))):
+            names = [names]
+        return [angles[self.joints.index(name)] for name in names]
@@ -0,0 +1,165 @@
+# -*- coding: future_fstrings -*-
+# utils/latency.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+from config import LATENCY_WINDOW, LATENCY_MAX_PENDING, NAO_CLOCK_OFFSET, LATENCY_DUMP_DIR
+
+# Stage name -> (start stamp, end stamp). Stamps in pipeline order:
+#   capture    NAO camera timestamp, mapped onto the client clock
+#   received   frame stored in the ring buffer
+#   encode     worker starts JPEG encoding
+#   sent       request handed to the HTTP session
+#   response   response body received
+#   annotated  first render using this prediction
+#   displayed  Tk shows that render
+#   actuated   head movement sent for this prediction
+STAGES = OrderedDict([
+    ('camera', ('capture', 'received')),
+    ('queue', ('received', 'encode')),
+    ('encode', ('encode', 'sent')),
+    ('round_trip', ('sent', 'response')),
+    ('annotate', ('response', 'annotated')),
+    ('display', ('annotated', 'displayed')),
+    ('actuate', ('response', 'actuated')),
+    ('glass_to_display', ('capture', 'displayed')),
+    ('glass_to_actuation', ('capture', 'actuated')),
+])
+
+class LatencyTracker(object):
+    """Per-frame latency breakdown from NAO capture to display and head actuation.
+
+    Each frame sent for inference gets a record of wall-clock stamps as it
+    moves through the pipeline. Whenever a stamp completes a stage from
+    STAGES, the stage's duration goes into a rolling window of the last
+    ``window`` samples; percentiles() summarises those windows. The server's
+    own processing time and the network share of the round trip are kept as
+    the extra 'server' and 'network' stages.
+
+    NAO timestamps come from the robot's clock. With ``clock_offset`` set
+    (seconds added to NAO time) they are used as-is; with None the offset is
+    estimated from the fastest frame arrival seen so far, so 'camera' then
+    measures delay above the best-case transfer rather than absolute time.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW, max_pending=LATENCY_MAX_PENDING,
+                 clock_offset=NAO_CLOCK_OFFSET):
+        self.window = window
+        self.max_pending = max_pending
+        self.clock_offset = clock_offset
+        self._estimated_offset = None
+        self._records = OrderedDict()
+        self._completed = deque(maxlen=window)
+        self._samples = OrderedDict((name, deque(maxlen=window)) for name in
+                             list(STAGES) + ['server', 'network', 'local_detector'])
+        self._lock = threading.Lock()
+
+    def _to_client_clock(self, nao_time, received):
+        if self.clock_offset is not None:
+            return nao_time + self.clock_offset
+        offset = received - nao_time
+        if self._estimated_offset is None or offset < self._estimated_offset:
+            self._estimated_offset = offset
+        return nao_time + self._estimated_offset
+
+    def capture_time(self, frame):
+        """A ring buffer Frame's NAO capture time on the client's time.time() clock."""
+        with self._lock:
+            return self._to_client_clock(frame.timestamp, frame.received)
+
+    def begin(self, frame):
+        """Start a record for a ring buffer Frame that is about to be sent for inference."""
+        with self._lock:
+            capture = self._to_client_clock(frame.timestamp, frame.received)
+            self._records[frame.seq] = {'seq': frame.seq, 'nao_timestamp': frame.timestamp,
+                                        'capture': capture, 'received': frame.received}
+            self._complete_stages(self._records[frame.seq], 'received')
+            while len(self._records) > self.max_pending:
+                self._completed.append(self._records.popitem(last=False)[1])
+
+    def stamp(self, seq, name, when=None):
+        """Record stamp ``name`` for frame ``seq`` (ignored if the record is gone)."""
+        when = time.time() if when is None else when
+        with self._lock:
+            record = self._records.get(seq)
+            if record is None or name in record:
+                return
+            record[name] = when
+            self._complete_stages(record, name)
+
+    def _complete_stages(self, record, name):
+        for stage, (start, end) in STAGES.items():
+            if end == name and start in record:
+                self._samples[stage].append((record[end] - record[start]) * 1000.0)
+
+    def record_response(self, seq, prediction):
+        """Take the client and server timings carried by an inference result."""
+        timing = prediction.get('client_timing') or {}
+        server_ms = prediction.get('server_time_ms')
+        local_ms = prediction.get('local_time_ms')
+        with self._lock:
+            record = self._records.get(seq)
+            if record is None:
+                return
+            for name in ('encode', 'sent', 'response'):
+                if name in timing and name not in record:
+                    record[name] = timing[name]
+                    self._complete_stages(record, name)
+            if 'response' not in record:
+                # Answered by the local fallback detector; no network stages
+                record['response'] = time.time()
+            if server_ms is not None:
+                record['server_ms'] = server_ms
+                self._samples['server'].append(server_ms)
+                if 'sent' in timing:
+                    round_trip = (timing['response'] - timing['sent']) * 1000.0
+                    self._samples['network'].append(max(0.0, round_trip - server_ms))
+            if local_ms is not None:
+                record['local_ms'] = local_ms
+                self._samples['local_detector'].append(local_ms)
+
+    def percentiles(self, points=(50, 90, 99)):
+        """Rolling percentiles in ms per stage: {stage: {'n', 'p50', 'p90', ...}}."""
+        with self._lock:
+            samples = dict((name, list(values)) for name, values in self._samples.items())
+        summary = OrderedDict()
+        for name, values in samples.items():
+            if not values:
+                continue
+            stats = {'n': len(values)}
+            for point, value in zip(points, np.percentile(values, points)):
+                stats[f"p{point}"] = float(value)
+            summary[name] = stats
+        return summary
+
+    def dump(self, path=None):
+        """Write percentiles and recent per-frame breakdowns to a JSON file. Returns the path."""
+        if path is None:
+            if not os.path.exists(LATENCY_DUMP_DIR):
+                os.makedirs(LATENCY_DUMP_DIR)
+            path = os.path.join(LATENCY_DUMP_DIR, f"latency_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with self._lock:
+            frames = [dict(r, stages=_record_stages(r)) for r in
+                      list(self._completed) + list(self._records.values())]
+            clock_offset = self.clock_offset if self.clock_offset is not None else self._estimated_offset
+        report = {
+            'created': time.time(),
+            'clock_offset': clock_offset,
+            'clock_offset_estimated': self.clock_offset is None,
+            'percentiles': self.percentiles(),
+            'frames': frames
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+
+def _record_stages(record):
+    stages = OrderedDict()
+    for stage, (start, end) in STAGES.items():
+        if start in record and end in record:
+            stages[stage] = (record[end] - record[start]) * 1000.0
+    return stages
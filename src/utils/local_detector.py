@@ -0,0 +1,85 @@
+# -*- coding: future_fstrings -*-
+# utils/local_detector.py
+import os
+import time
+import threading
+import cv2
+from config import HAAR_CASCADE_PATH, LOCAL_DETECTOR_SCALE
+from config import LOCAL_DETECTOR_MIN_NEIGHBORS, LOCAL_DETECTOR_MIN_SIZE
+
+class LocalFaceDetector(object):
+    """Haar cascade face detector that runs on the client.
+
+    Used by InferenceClient while the inference server is unreachable, so
+    face tracking degrades instead of stopping. Results use the server's
+    schema ('face_locations' as [top, right, bottom, left] in full-frame
+    pixels) plus 'source': 'local' and 'local_time_ms'.
+    """
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, scale=LOCAL_DETECTOR_SCALE,
+                 min_neighbors=LOCAL_DETECTOR_MIN_NEIGHBORS, min_size=LOCAL_DETECTOR_MIN_SIZE,
+                 smoothing=0.2):
+        if cascade_path is None:
+            cascade_path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise IOError(f"Could not load Haar cascade from {cascade_path}")
+        self.scale = scale
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+        self.smoothing = smoothing
+
+        # Latency of local detections, kept apart from the server's RTT
+        self.calls = 0
+        self.last_ms = None
+        self.avg_ms = None
+        self._lock = threading.Lock()
+
+    def detect(self, image):
+        """Detect faces in an RGB frame and return a server-style face prediction."""
+        started = time.time()
+        small = image
+        if self.scale != 1.0:
+            small = cv2.resize(image, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        gray = cv2.equalizeHist(gray)
+
+        # CascadeClassifier is not safe to share between threads
+        with self._lock:
+            faces = self.classifier.detectMultiScale(
+                gray, scaleFactor=1.1, minNeighbors=self.min_neighbors, minSize=self.min_size
+            )
+
+        face_locations = []
+        for (x, y, w, h) in faces:
+            face_locations.append([
+                int(round(y / self.scale)),
+                int(round((x + w) / self.scale)),
+                int(round((y + h) / self.scale)),
+                int(round(x / self.scale))
+            ])
+
+        elapsed_ms = (time.time() - started) * 1000.0
+        with self._lock:
+            self.calls += 1
+            self.last_ms = elapsed_ms
+            if self.avg_ms is None:
+                self.avg_ms = elapsed_ms
+            else:
+                self.avg_ms += self.smoothing * (elapsed_ms - self.avg_ms)
+
+        return {'face_locations': face_locations, 'source': 'local', 'local_time_ms': elapsed_ms}
+
+    def snapshot(self):
+        """Call count and smoothed latency of local detections."""
+        with self._lock:
+            return {'calls': self.calls, 'last_ms': self.last_ms, 'avg_ms': self.avg_ms}
+
+
+def load_local_detector():
+    """Create the fallback detector, or return None if the cascade can't be loaded."""
+    try:
+        return LocalFaceDetector()
+    except Exception as e:
+        print(f"Local fallback detector unavailable: {e}")
+        return None
@@ -0,0 +1,189 @@
+# -*- coding: future_fstrings -*-
+# utils/motion_dispatcher.py
+"""Coalescing, rate-limited sender for body and head motion commands.
+
+GUI loops and trackers post commands as often as they like; a single
+dispatcher thread forwards them to ALMotion only when they change (body
+velocities are also refreshed at a slow minimum rate) and at most once per
+``interval`` per channel. Calls are made with _async=True, so neither the
+caller nor the dispatcher waits on the robot.
+
+Self-contained (no config import) so better_gui can load it as well.
+"""
+import threading
+import time
+from collections import defaultdict
+
+HEAD_JOINTS = ["HeadYaw", "HeadPitch"]
+HEAD_LIMITS = ((-2.0857, 2.0857), (-0.6720, 0.5149))  # Yaw, pitch limits in radians
+
+def clamp_head(yaw, pitch):
+    """Clamp head angles to NAO's joint limits."""
+    (yaw_min, yaw_max), (pitch_min, pitch_max) = HEAD_LIMITS
+    return max(min(yaw, yaw_max), yaw_min), max(min(pitch, pitch_max), pitch_min)
+
+
+class MotionDispatcher(object):
+    """Owns all moveToward/stopMove/setAngles traffic to one ALMotion service.
+
+    Body: set_velocity() stores the desired walk velocity. A change is sent
+    on the next tick (stopMove for zero, moveToward otherwise); an unchanged
+    non-zero velocity is re-sent every ``refresh_interval`` seconds.
+
+    Head: set_head_angles() (absolute) and change_head() (relative to the
+    current head pose) are merged latest-wins, the same as a new setAngles
+    superseding the previous one. Relative moves are resolved on the
+    dispatcher thread with ``joint_source()``, which defaults to a getAngles
+    call on the motion service.
+
+    A channel whose previous async call has not finished yet keeps its
+    newest command for the next tick instead of queueing more calls.
+    """
+
+    def __init__(self, motion_service, interval=0.02, refresh_interval=1.0, joint_source=None):
+        self.motion_service = motion_service
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        self.joint_source = joint_source or self._sensed_head_angles
+        self.use_async = True
+
+        self._lock = threading.Lock()
+        self._velocity = (0.0, 0.0, 0.0)
+        self._sent_velocity = None
+        self._last_body_send = 0.0
+        self._head_command = None
+        self._last_head_target = None
+        self._pending = {}
+
+        self._requests = defaultdict(int)
+        self._rpcs = defaultdict(int)
+        self.started = time.time()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    # Commands (any thread, never blocks on the robot)
+
+    def set_velocity(self, x, y, theta):
+        """Desired normalised walk velocity; (0, 0, 0) stops."""
+        with self._lock:
+            self._requests['body'] += 1
+            self._velocity = (x, y, theta)
+
+    def set_head_angles(self, yaw, pitch, speed):
+        """Move the head to absolute angles at ``speed`` (fraction of max speed)."""
+        with self._lock:
+            self._requests['head'] += 1
+            self._head_command = ('absolute', yaw, pitch, speed)
+
+    def change_head(self, yaw_change, pitch_change, speed):
+        """Move the head relative to its current pose."""
+        if yaw_change == 0.0 and pitch_change == 0.0:
+            return
+        with self._lock:
+            self._requests['head'] += 1
+            self._head_command = ('relative', yaw_change, pitch_change, speed)
+
+    # Dispatcher thread
+
+    def _sensed_head_angles(self):
+        self._rpcs['getAngles'] += 1
+        return self.motion_service.getAngles(HEAD_JOINTS, True)
+
+    def _run(self):
+        # One tick per interval caps each channel at 1/interval RPCs per second
+        while self.running:
+            started = time.time()
+            with self._lock:
+                velocity = self._velocity
+                head_command = self._head_command
+            try:
+                self._dispatch_body(velocity)
+                if head_command is not None:
+                    self._dispatch_head(head_command)
+            except Exception as e:
+                print(f"Error dispatching motion: {e}")
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def _busy(self, channel):
+        future = self._pending.get(channel)
+        if future is None:
+            return False
+        try:
+            if not future.isFinished():
+                return True
+            if future.hasError():
+                print(f"Motion command failed: {future.error()}")
+        except Exception:
+            pass
+        self._pending.pop(channel, None)
+        return False
+
+    def _dispatch_body(self, velocity):
+        now = time.time()
+        moving = velocity != (0.0, 0.0, 0.0)
+        changed = velocity != self._sent_velocity
+        refresh = moving and now - self._last_body_send >= self.refresh_interval
+        if not (changed or refresh) or self._busy('body'):
+            return
+        if moving:
+            self._call('body', 'moveToward', *velocity)
+        else:
+            self._call('body', 'stopMove')
+        self._sent_velocity = velocity
+        self._last_body_send = now
+
+    def _dispatch_head(self, command):
+        if self._busy('head'):
+            return
+        kind, yaw, pitch, speed = command
+        if kind == 'relative':
+            current_yaw, current_pitch = self.joint_source()
+            yaw, pitch = current_yaw + yaw, current_pitch + pitch
+        target = clamp_head(yaw, pitch)
+        with self._lock:
+            # Newer commands posted meanwhile stay pending
+            if self._head_command is command:
+                self._head_command = None
+        if kind == 'absolute' and (target, speed) == self._last_head_target:
+            return
+        self._call('head', 'setAngles', HEAD_JOINTS, list(target), speed)
+        self._last_head_target = (target, speed)
+
+    def _call(self, channel, method, *args):
+        function = getattr(self.motion_service, method)
+        self._rpcs[method] += 1
+        if self.use_async:
+            try:
+                self._pending[channel] = function(*args, _async=True)
+                return
+            except TypeError:
+                # Older SDKs without _async: still off the caller's thread
+                self.use_async = False
+        function(*args)
+
+    def snapshot(self):
+        """Requested commands vs RPCs actually sent, as totals and per second."""
+        elapsed = max(time.time() - self.started, 1e-6)
+        with self._lock:
+            requests = dict(self._requests)
+        rpcs = dict(self._rpcs)
+        return {
+            'requests': requests,
+            'rpcs': rpcs,
+            'requests_per_s': sum(requests.values()) / elapsed,
+            'rpcs_per_s': sum(rpcs.values()) / elapsed
+        }
@@ -0,0 +1,57 @@
+# -*- coding: future_fstrings -*-
+# utils/pipeline.py
+import threading
+import time
+
+class LatestValue(object):
+    """Single-slot queue between pipeline stages that only keeps the newest value.
+
+    Producers never block and overwrite whatever has not been consumed yet.
+    Every put() gets an increasing sequence number, so several consumers can
+    each wait for "something newer than what I last saw" independently.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self._closed = False
+
+    def put(self, value):
+        """Publish a value, replacing the previous one. Returns its sequence number."""
+        with self._cond:
+            self._seq += 1
+            self._value = value
+            self._cond.notify_all()
+            return self._seq
+
+    def get(self, after_seq=0, timeout=None):
+        """Wait for a value newer than ``after_seq``.
+
+        Returns (seq, value), or (after_seq, None) on timeout or close.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._seq <= after_seq and not self._closed:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return after_seq, None
+                self._cond.wait(remaining)
+            if self._seq <= after_seq:
+                return after_seq, None
+            return self._seq, self._value
+
+    def peek(self):
+        """Return the current (seq, value) without waiting."""
+        with self._cond:
+            return self._seq, self._value
+
+    def close(self):
+        """Wake up all waiting consumers; further get() calls return immediately."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
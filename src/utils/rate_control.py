@@ -0,0 +1,109 @@
+# -*- coding: future_fstrings -*-
+# utils/rate_control.py
+import threading
+from config import LATENCY_BUDGET_MS, JPEG_QUALITY_MIN, JPEG_QUALITY_MAX, JPEG_QUALITY_STEP
+from config import CLIENT_SCALES, SEND_INTERVAL_MIN, SEND_INTERVAL_MAX, SEND_INTERVAL_STEP
+
+class AdaptiveRateController(object):
+    """AIMD controller for JPEG quality, client-side downscale and send interval.
+
+    Each response reports its round-trip time and the server's own
+    processing time (``server_time_ms``). While the smoothed RTT is over the
+    latency budget the controller backs off multiplicatively, on whichever
+    side is the bottleneck:
+
+    - network time dominates: lower JPEG quality, then downscale the frame
+    - server time dominates: send less often
+
+    With enough headroom it recovers additively, one step per
+    ``increase_every`` good samples: send rate first, then resolution, then
+    quality.
+    """
+
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS, quality_min=JPEG_QUALITY_MIN,
+                 quality_max=JPEG_QUALITY_MAX, quality_step=JPEG_QUALITY_STEP,
+                 scales=CLIENT_SCALES, interval_min=SEND_INTERVAL_MIN,
+                 interval_max=SEND_INTERVAL_MAX, interval_step=SEND_INTERVAL_STEP,
+                 smoothing=0.2, headroom=0.8, increase_every=3, decrease_factor=0.75):
+        self.budget_ms = budget_ms
+        self.quality_min = quality_min
+        self.quality_max = quality_max
+        self.quality_step = quality_step
+        self.scales = scales
+        self.interval_min = interval_min
+        self.interval_max = interval_max
+        self.interval_step = interval_step
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.increase_every = increase_every
+        self.decrease_factor = decrease_factor
+
+        # Start at the best operating point and back off if the link can't take it
+        self.quality = quality_max
+        self.scale_index = 0
+        self.send_interval = interval_min
+        self.rtt_ms = None
+        self.server_ms = None
+        self._good_samples = 0
+        self._lock = threading.Lock()
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def observe(self, rtt_ms, server_ms=None):
+        """Record one completed request and adjust the operating point."""
+        with self._lock:
+            self.rtt_ms = self._smooth(self.rtt_ms, rtt_ms)
+            if server_ms is not None:
+                self.server_ms = self._smooth(self.server_ms, server_ms)
+
+            if self.rtt_ms > self.budget_ms:
+                self._good_samples = 0
+                self._decrease()
+            elif self.rtt_ms < self.budget_ms * self.headroom:
+                self._good_samples += 1
+                if self._good_samples >= self.increase_every:
+                    self._good_samples = 0
+                    self._increase()
+
+    def observe_timeout(self, timeout_ms):
+        """Record a request that missed its deadline; counts as a slow round trip."""
+        self.observe(timeout_ms)
+
+    def _decrease(self):
+        server_ms = self.server_ms or 0.0
+        network_ms = max(0.0, self.rtt_ms - server_ms)
+        if server_ms < network_ms:
+            if self.quality > self.quality_min:
+                self.quality = max(self.quality_min, int(self.quality * self.decrease_factor))
+                return
+            if self.scale_index < len(self.scales) - 1:
+                self.scale_index += 1
+                return
+        self.send_interval = min(self.interval_max, self.send_interval / self.decrease_factor)
+
+    def _increase(self):
+        if self.send_interval > self.interval_min:
+            self.send_interval = max(self.interval_min, self.send_interval - self.interval_step)
+        elif self.scale_index > 0:
+            self.scale_index -= 1
+        elif self.quality < self.quality_max:
+            self.quality = min(self.quality_max, self.quality + self.quality_step)
+
+    def snapshot(self):
+        """Current operating point and smoothed measurements."""
+        with self._lock:
+            return {
+                'quality': self.quality,
+                'scale': self.scale,
+                'send_interval': self.send_interval,
+                'rtt_ms': self.rtt_ms,
+                'server_ms': self.server_ms,
+                'budget_ms': self.budget_ms
+            }
@@ -0,0 +1,331 @@
+# -*- coding: future_fstrings -*-
+# utils/recording.py
+"""Record robot sessions to disk and replay them without a robot.
+
+A recording is a directory:
+
+    meta.json          frame shape, chunk size, start time
+    index.bin          one fixed-size INDEX_DTYPE row per frame, appended as frames arrive
+    frames_00000.bin   fixed-stride frame records (header + RGB pixels), FRAMES_PER_CHUNK each
+    events.jsonl       one JSON object per line: {"t", "kind", "data"}
+
+Every file is append-only, so a crashed session is still readable up to its
+last complete frame. Frame chunks are plain arrays of a numpy structured
+dtype and are opened with np.memmap for random access.
+
+This module only depends on numpy so better_gui can load it as well.
+"""
+import json
+import os
+import threading
+import time
+import bisect
+import numpy as np
+
+FORMAT_VERSION = 1
+FRAMES_PER_CHUNK = 300          # ~10 s at 30 fps per chunk file
+JOINT_SAMPLE_INTERVAL = 0.1     # Seconds between recorded head joint samples
+
+INDEX_DTYPE = np.dtype([('seq', '<u8'), ('nao_timestamp', '<f8'), ('received', '<f8')])
+
+def frame_dtype(width, height):
+    """Fixed-stride on-disk record for one frame."""
+    return np.dtype([('seq', '<u8'), ('nao_timestamp', '<f8'), ('received', '<f8'),
+                     ('pixels', 'u1', (height, width, 3))])
+
+def _chunk_path(path, chunk):
+    return os.path.join(path, f"frames_{chunk:05d}.bin")
+
+
+class SessionRecorder(object):
+    """Append camera frames and session events to a recording directory.
+
+    Frames are pulled from a FrameRingBuffer by the recorder's own thread,
+    so recording never adds camera RPCs. If a motion service (or anything
+    with its getAngles, such as a JointStateCache) is given, head joint
+    angles are sampled as 'joints' events. Other components add
+    inference results and motion commands through record_event().
+    """
+
+    def __init__(self, path, frames=None, motion_service=None,
+                 frames_per_chunk=FRAMES_PER_CHUNK, joint_interval=JOINT_SAMPLE_INTERVAL):
+        self.path = path
+        self.frames = frames
+        self.motion_service = motion_service
+        self.frames_per_chunk = frames_per_chunk
+        self.joint_interval = joint_interval
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.frame_count = 0
+        self.shape = None
+        self._record = None
+        self._chunk_file = None
+        self._index_file = open(os.path.join(path, 'index.bin'), 'ab')
+        self._events_file = open(os.path.join(path, 'events.jsonl'), 'a')
+        self._frame_lock = threading.Lock()
+        self._event_lock = threading.Lock()
+        self.started = time.time()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start recording frames from the ring buffer in the background."""
+        if self.running or self.frames is None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"Recording session to {self.path}")
+
+    def _run(self):
+        last_seq = 0
+        next_joint_sample = 0.0
+        while self.running:
+            frame = self.frames.latest(last_seq, timeout=0.1)
+            if frame is not None:
+                last_seq = frame.seq
+                try:
+                    self.write_frame(frame.seq, frame.timestamp, frame.received, frame.image)
+                except Exception as e:
+                    print(f"Error recording frame: {e}")
+            if self.motion_service is not None and time.time() >= next_joint_sample:
+                next_joint_sample = time.time() + self.joint_interval
+                try:
+                    yaw, pitch = self.motion_service.getAngles(["HeadYaw", "HeadPitch"], True)
+                    self.record_event('joints', {'HeadYaw': yaw, 'HeadPitch': pitch})
+                except Exception as e:
+                    print(f"Error sampling joints for recording: {e}")
+
+    def _write_meta(self):
+        height, width = self.shape[:2]
+        meta = {
+            'version': FORMAT_VERSION,
+            'width': width,
+            'height': height,
+            'frames_per_chunk': self.frames_per_chunk,
+            'started': self.started,
+            'frame_count': self.frame_count
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def write_frame(self, seq, nao_timestamp, received, image):
+        """Append one RGB frame. Frames with a different shape than the first are skipped."""
+        with self._frame_lock:
+            if self.shape is None:
+                self.shape = image.shape
+                self._record = np.zeros(1, dtype=frame_dtype(image.shape[1], image.shape[0]))
+                self._write_meta()
+            elif image.shape != self.shape:
+                print(f"Skipping frame {seq}: shape {image.shape} != recording shape {self.shape}")
+                return
+
+            row = self.frame_count % self.frames_per_chunk
+            if row == 0:
+                if self._chunk_file is not None:
+                    self._chunk_file.close()
+                chunk = self.frame_count // self.frames_per_chunk
+                self._chunk_file = open(_chunk_path(self.path, chunk), 'ab')
+
+            # One preallocated record reused for every frame
+            record = self._record
+            record['seq'][0] = seq
+            record['nao_timestamp'][0] = nao_timestamp
+            record['received'][0] = received
+            record['pixels'][0] = image
+            self._chunk_file.write(self._record.tobytes())
+            self._chunk_file.flush()
+
+            # Index row last, so readers never see an index entry without its frame
+            index = np.array([(seq, nao_timestamp, received)], dtype=INDEX_DTYPE)
+            self._index_file.write(index.tobytes())
+            self._index_file.flush()
+            self.frame_count += 1
+
+    def record_event(self, kind, data, when=None):
+        """Append an event such as an inference result or a motion command."""
+        line = json.dumps({'t': time.time() if when is None else when, 'kind': kind, 'data': data},
+                          default=str)
+        with self._event_lock:
+            if self._events_file.closed:
+                return
+            self._events_file.write(line + '\n')
+
+    def stop(self):
+        """Stop recording and close all files."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        with self._frame_lock:
+            if self._chunk_file is not None:
+                self._chunk_file.close()
+                self._chunk_file = None
+            self._index_file.close()
+            if self.shape is not None:
+                self._write_meta()
+        with self._event_lock:
+            self._events_file.close()
+        print(f"Recorded {self.frame_count} frames to {self.path}")
+
+
+class SessionPlayer(object):
+    """Replays a recording through the ALVideoDevice methods the clients use.
+
+    subscribe()/getImageRemote()/unsubscribe() behave like the NAOqi
+    service, so a SessionPlayer can stand in for ``video_service``. Each
+    subscriber gets its own playback clock: with ``speed`` 1.0 frames come
+    back at their recorded pace, 4.0 plays four times faster, and None
+    returns the next frame on every call (as fast as the caller can pull).
+    """
+
+    def __init__(self, path, speed=1.0, loop=True):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.width = self.meta['width']
+        self.height = self.meta['height']
+        self.frames_per_chunk = self.meta['frames_per_chunk']
+        self.dtype = frame_dtype(self.width, self.height)
+
+        index = np.fromfile(os.path.join(path, 'index.bin'), dtype=INDEX_DTYPE)
+        self.index = index[:self._complete_frames(len(index))]
+        self.offsets = self.index['received'] - self.index['received'][0] if len(self.index) else []
+        self._chunks = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._events = None
+
+    def _complete_frames(self, indexed):
+        # A crash can leave the last chunk shorter than the index claims
+        chunks = (indexed + self.frames_per_chunk - 1) // self.frames_per_chunk
+        if chunks == 0:
+            return 0
+        last = _chunk_path(self.path, chunks - 1)
+        rows = os.path.getsize(last) // self.dtype.itemsize if os.path.exists(last) else 0
+        return min(indexed, (chunks - 1) * self.frames_per_chunk + rows)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        """Recorded length in seconds."""
+        return float(self.offsets[-1]) if len(self.index) else 0.0
+
+    def frame(self, i):
+        """Return frame record ``i`` (fields seq, nao_timestamp, received, pixels) from the mmap."""
+        chunk, row = divmod(i, self.frames_per_chunk)
+        mapped = self._chunks.get(chunk)
+        if mapped is None:
+            path = _chunk_path(self.path, chunk)
+            rows = os.path.getsize(path) // self.dtype.itemsize
+            mapped = np.memmap(path, dtype=self.dtype, mode='r', shape=(rows,))
+            self._chunks[chunk] = mapped
+        return mapped[row]
+
+    def frame_at(self, offset):
+        """Index of the frame shown ``offset`` seconds into the recording."""
+        return max(0, bisect.bisect_right(self.offsets, offset) - 1)
+
+    def iter_frames(self):
+        """Yield every frame record in order, e.g. to drive a server load test."""
+        for i in range(len(self)):
+            yield self.frame(i)
+
+    def events(self, kind=None, start=None, end=None):
+        """Recorded events, optionally filtered by kind and wall-clock time range."""
+        if self._events is None:
+            self._events = []
+            with open(os.path.join(self.path, 'events.jsonl')) as f:
+                for line in f:
+                    try:
+                        self._events.append(json.loads(line))
+                    except ValueError:
+                        break  # Truncated last line of an interrupted session
+        return [e for e in self._events
+                if (kind is None or e['kind'] == kind)
+                and (start is None or e['t'] >= start)
+                and (end is None or e['t'] < end)]
+
+    # ALVideoDevice subset
+
+    def subscribe(self, name, resolution=None, color_space=None, fps=None):
+        with self._lock:
+            self._clients[name] = {'started': time.time(), 'next': 0}
+        return name
+
+    def unsubscribe(self, name):
+        with self._lock:
+            self._clients.pop(name, None)
+
+    def setActiveCamera(self, camera_id):
+        return True
+
+    def setParameter(self, name, parameter, value):
+        return True
+
+    def releaseImage(self, name):
+        return True
+
+    def getImageRemote(self, name):
+        """Return the due frame as [width, height, layers, colorspace, sec, usec, data]."""
+        if not len(self.index):
+            return None
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                return None
+            if self.speed:
+                i = self.frame_at((time.time() - client['started']) * self.speed)
+                if i >= len(self) - 1 and self.loop:
+                    client['started'] = time.time()
+            else:
+                i = client['next']
+                client['next'] = (i + 1) % len(self) if self.loop else min(i + 1, len(self) - 1)
+
+        record = self.frame(i)
+        timestamp = float(record['nao_timestamp'])
+        seconds = int(timestamp)
+        return [self.width, self.height, 3, 11, seconds, int(round((timestamp - seconds) * 1e6)),
+                record['pixels'].tobytes()]
+
+
+if __name__ == '__main__':
+    # Load test: replay a recording against the inference server and report latency
+    import argparse
+    from utils.image_utils import InferenceClient
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session against the inference server")
+    parser.add_argument('path', help="Recording directory")
+    parser.add_argument('--mode', default='face', choices=['face', 'yolo', 'tflite', 'both'])
+    parser.add_argument('--speed', type=float, default=0.0, help="Playback speed; 0 sends as fast as possible")
+    parser.add_argument('--limit', type=int, default=0, help="Stop after this many frames")
+    args = parser.parse_args()
+
+    player = SessionPlayer(args.path, speed=args.speed or None, loop=False)
+    client = InferenceClient()
+    latencies = []
+    failures = 0
+    start = time.time()
+    for i, record in enumerate(player.iter_frames()):
+        if args.limit and i >= args.limit:
+            break
+        if args.speed:
+            time.sleep(max(0.0, player.offsets[i] / args.speed - (time.time() - start)))
+        sent = time.time()
+        if client.predict(record['pixels'], args.mode) is None:
+            failures += 1
+        else:
+            latencies.append((time.time() - sent) * 1000.0)
+    elapsed = time.time() - start
+    client.close()
+
+    print(f"{len(latencies)} ok, {failures} failed in {elapsed:.1f}s ({len(latencies) / max(elapsed, 1e-6):.1f} req/s)")
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        print(f"latency ms: p50 {p50:.1f} | p90 {p90:.1f} | p99 {p99:.1f}")
@@ -0,0 +1,68 @@
+# -*- coding: future_fstrings -*-
+# tests/test_circuit_breaker.py - run from the repo root: python -m unittest discover -s tests
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+from utils.image_utils import CircuitBreaker, InferenceClient
+
+
+class BadJsonResponse(object):
+    status_code = 200
+
+    def json(self):
+        raise ValueError("No JSON object could be decoded")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, backoff_initial=60.0)
+        self.breaker.record_failure()
+        self.breaker.retry_at = 0.0  # Backoff over: the next allow() is the half-open probe
+        self.client = InferenceClient(predict_url='http://127.0.0.1:9', breaker=self.breaker)
+        self.image = np.zeros((24, 32, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_probe_expired_in_queue_is_released(self):
+        seq = self.client.submit(self.image, 'face', timeout=-1.0)
+        self.assertIsNotNone(seq)
+        deadline = time.time() + 2.0
+        while not self.client.collect() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_released_when_encoding_fails(self):
+        def broken_encode(image, quality=None, scale=1.0):
+            raise RuntimeError("encode failed")
+        self.client.encode = broken_encode
+        self.assertIsNone(self.client.predict(self.image, 'face'))
+        self.assertTrue(self.breaker.allow())
+
+    def test_ordinary_request_does_not_release_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, backoff_initial=60.0)
+        permit = breaker.allow()  # Admitted while closed
+        breaker.record_failure()
+        breaker.retry_at = 0.0
+        probe = breaker.allow()
+        self.assertEqual(probe, CircuitBreaker.PROBE)
+        breaker.release(permit)
+        self.assertFalse(breaker.allow())
+        breaker.release(probe)
+        self.assertEqual(breaker.allow(), CircuitBreaker.PROBE)
+
+    def test_bad_json_counts_as_failure(self):
+        self.client.session.post = lambda *args, **kwargs: BadJsonResponse()
+        self.assertIsNone(self.client.predict(self.image, 'face'))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: future_fstrings -*-
+# tests/test_joint_state.py - run from the repo root: python -m unittest discover -s tests
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+from utils.joint_state import JointStateCache
+
+
+class CountingMotion(object):
+    def __init__(self):
+        self.calls = 0
+
+    def getAngles(self, names, useSensors):
+        self.calls += 1
+        time.sleep(0.001)
+        return [0.1 * self.calls, -0.05]
+
+
+class JointStateCacheTest(unittest.TestCase):
+
+    def test_idle_sampler_makes_no_calls(self):
+        motion = CountingMotion()
+        cache = JointStateCache(motion, interval=0.01, idle_after=0.05)
+        cache.start()
+        try:
+            time.sleep(0.2)
+            self.assertEqual(motion.calls, 0)
+            cache.read(0.0)
+            time.sleep(0.03)
+            self.assertGreater(motion.calls, 1)
+            time.sleep(0.1)
+            idle_calls = motion.calls
+            time.sleep(0.1)
+            self.assertEqual(motion.calls, idle_calls)
+        finally:
+            cache.stop()
+
+    def test_history_stays_in_time_order(self):
+        cache = JointStateCache(CountingMotion(), interval=0.0, idle_after=10.0)
+        cache.start()
+        readers = [threading.Thread(target=lambda: [cache.read(0.0) for _ in range(100)]) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        cache.stop()
+        times, _ = cache.history()
+        self.assertTrue(np.all(np.diff(times) > 0))
+
+    def test_stale_reading_is_dropped(self):
+        cache = JointStateCache(CountingMotion())
+        cache.update([0.2, 0.0], timestamp=10.0)
+        cache.update([0.1, 0.0], timestamp=9.0)
+        self.assertEqual(cache.angles, [0.2, 0.0])
+        self.assertEqual(len(cache.history()[0]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
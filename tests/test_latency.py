@@ -0,0 +1,29 @@
+# -*- coding: future_fstrings -*-
+# tests/test_latency.py - run from the repo root: python -m unittest discover -s tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils.frame_buffer import Frame
+from utils.latency import LatencyTracker
+
+
+class LatencyTrackerTest(unittest.TestCase):
+
+    def test_camera_stage_sampled_on_begin(self):
+        tracker = LatencyTracker(clock_offset=0.0)
+        for seq in range(1, 4):
+            frame = Frame(seq, 100.0 + seq, 100.0 + seq + 0.04, None)
+            tracker.begin(frame)
+            tracker.stamp(seq, 'encode', frame.received + 0.01)
+            tracker.record_response(seq, {'client_timing': {'sent': frame.received + 0.02,
+                                                             'response': frame.received + 0.05}})
+        camera = tracker.percentiles()['camera']
+        self.assertEqual(camera['n'], 3)
+        self.assertAlmostEqual(camera['p50'], 40.0, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()